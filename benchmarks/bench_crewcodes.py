@@ -0,0 +1,276 @@
+import os
+import sys
+import time
+import json
+import random
+import logging
+import argparse
+import statistics
+from types import SimpleNamespace
+
+from ipaas import utils
+
+from benchmarks import reference_crewcodes
+
+# *********************************************************************
+# LOGGING
+# *********************************************************************
+
+log_level = os.environ.get("LOG_LEVEL", "INFO")
+log_format = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+logging.basicConfig(stream=sys.stdout, level=log_level, format=log_format)
+
+# Set the log to use GMT time zone
+logging.Formatter.converter = time.gmtime
+
+# Add milliseconds
+logging.Formatter.default_msec_format = "%s.%03d"
+
+log = logging.getLogger("bench_crewcodes")
+
+# *********************************************************************
+# MICRO-BENCHMARKS for the per-employee hot paths
+# get_active_facilities_crew_code, compare_crewcodes and get_crew_update
+#
+# python -m benchmarks.bench_crewcodes                       # run and print ns per record, and relative to the reference
+# python -m benchmarks.bench_crewcodes --save                # store the results as the new baselines
+# python -m benchmarks.bench_crewcodes --check               # exit 1 if slower than baseline + threshold
+# python -m benchmarks.bench_crewcodes --sizes 10000 1000000
+#
+# Run from the repo root, utils loads crew_codes_to_exclude.json from the working directory.
+# Each benchmark times ipaas.utils against the frozen reference implementations in
+# reference_crewcodes.py, pass for pass in the same process, and keeps the median ratio.
+# A faster, slower or noisy host scales both sides, so the baselines hold across machines.
+# *********************************************************************
+
+BASELINES_FILE = os.path.join(os.path.dirname(__file__), "baselines.json")
+SIZES = (10_000, 100_000, 1_000_000)
+THRESHOLD = 0.25  # fail --check when more than 25% slower per record than the baseline
+REPEATS = 5
+MIN_RECORDS_PER_BENCHMARK = 2_000_000  # small sizes repeat until this many records ran, one short pass is mostly noise
+POOL_SIZE = 50_000  # distinct synthetic records, larger sizes reuse them so 1M records fit in memory
+SEED = 26
+
+CREW_CODES = ["ACS", "BAS", "BR", "HLS", "TS"]
+EXCLUDED_CREW_CODES = ["ML", "CEOPS"]
+
+# *******************************************************************************
+# SYNTHETIC DATA
+# employees mix job counts, null jobs, null crews, excluded crews, inactive jobs and
+# multi-crew conflicts; persons mix matching, different and missing trades & labor groups
+# *******************************************************************************
+
+def synthetic_job(rng: random.Random) -> dict:
+    roll = rng.random()
+    if roll < 0.10:
+        crew_code = None
+    elif roll < 0.20:
+        crew_code = rng.choice(EXCLUDED_CREW_CODES)
+    else:
+        crew_code = rng.choice(CREW_CODES)
+
+    job = {"job_title": "Mechanic", "job_current_status": "Active" if rng.random() < 0.8 else "Inactive"}
+    if rng.random() < 0.95:
+        job["maintenance_crew"] = {"crew_code": crew_code, "crew_name": f"{crew_code} crew"}
+    return job
+
+
+def synthetic_employee(rng: random.Random, n: int) -> dict:
+    netid = f"f{n:06d}"
+    roll = rng.random()
+
+    if roll < 0.05:
+        return {"netid": netid, "jobs": None}
+
+    if roll < 0.07:
+        # multi-crew conflict, get_active_facilities_crew_code raises ValueError
+        first, second = rng.sample(CREW_CODES, 2)
+        jobs = [
+            {"job_title": "Mechanic", "maintenance_crew": {"crew_code": first}, "job_current_status": "Active"},
+            {"job_title": "Mechanic", "maintenance_crew": {"crew_code": second}, "job_current_status": "Active"},
+        ]
+        return {"netid": netid, "jobs": jobs}
+
+    job_count = rng.choices([0, 1, 2, 3, 4], weights=[5, 60, 20, 10, 5])[0]
+    jobs = [synthetic_job(rng) for _ in range(job_count)]
+
+    # several active jobs on one crew, the common case that is not a conflict
+    crew_codes = {job["maintenance_crew"]["crew_code"] for job in jobs if job.get("maintenance_crew") and job["job_current_status"] == "Active"}
+    if len(crew_codes - {None, *EXCLUDED_CREW_CODES}) > 1:
+        crew_code = rng.choice(CREW_CODES)
+        for job in jobs:
+            if job.get("maintenance_crew") and job["maintenance_crew"]["crew_code"] not in (None, *EXCLUDED_CREW_CODES):
+                job["maintenance_crew"]["crew_code"] = crew_code
+
+    return {"netid": netid, "jobs": jobs}
+
+
+def synthetic_catalog():
+    trades = [SimpleNamespace(Syscode=100 + n, Code=code) for n, code in enumerate(CREW_CODES + EXCLUDED_CREW_CODES)]
+    laborgroups = [SimpleNamespace(Syscode=50 + n, Code=code) for n, code in enumerate(CREW_CODES + EXCLUDED_CREW_CODES)]
+
+    return (
+        {trade.Syscode: trade for trade in trades},
+        {trade.Code: trade for trade in trades},
+        {laborgroup.Syscode: laborgroup for laborgroup in laborgroups},
+        {laborgroup.Code: laborgroup for laborgroup in laborgroups},
+    )
+
+
+def synthetic_person(rng: random.Random, n: int, trade_syscodes: list[int], laborgroup_syscodes: list[int]) -> SimpleNamespace:
+    return SimpleNamespace(
+        Syscode=n,
+        NetID=f"f{n:06d}",
+        TradeRef=rng.choice(trade_syscodes) if rng.random() < 0.8 else None,
+        WorkingHoursTariffGroupRef=rng.choice(laborgroup_syscodes) if rng.random() < 0.8 else None,
+    )
+
+
+def synthetic_data(size: int):
+    """Returns size employees, their active crew codes and size Planon persons, built from a pool of distinct records."""
+    rng = random.Random(SEED)
+    catalog = synthetic_catalog()
+    trade_syscodes, laborgroup_syscodes = list(catalog[0]), list(catalog[2])
+
+    pool = min(size, POOL_SIZE)
+    employees = [synthetic_employee(rng, n) for n in range(pool)]
+    persons = [synthetic_person(rng, n, trade_syscodes, laborgroup_syscodes) for n in range(pool)]
+
+    active_crew_codes = []
+    for employee in employees:
+        try:
+            active_crew_codes.append(utils.get_active_facilities_crew_code(employee))
+        except ValueError:
+            active_crew_codes.append("")
+
+    repeat = -(-size // pool)
+    return (employees * repeat)[:size], (active_crew_codes * repeat)[:size], (persons * repeat)[:size], catalog
+
+# *******************************************************************************
+# BENCHMARKS - each returns the seconds one pass over all records takes, with the
+# functions of impl: ipaas.utils or reference_crewcodes
+# *******************************************************************************
+
+def bench_get_active_facilities_crew_code(impl, employees, active_crew_codes, persons, catalog):
+    get_active_facilities_crew_code = impl.get_active_facilities_crew_code
+
+    start = time.perf_counter()
+    for employee in employees:
+        try:
+            get_active_facilities_crew_code(employee)
+        except ValueError:
+            pass
+    return time.perf_counter() - start
+
+
+def bench_compare_crewcodes(impl, employees, active_crew_codes, persons, catalog):
+    compare_crewcodes = impl.compare_crewcodes
+    trades_by_syscodes, _, laborgroups_by_syscodes, _ = catalog
+
+    start = time.perf_counter()
+    for active_crew_code, person in zip(active_crew_codes, persons):
+        compare_crewcodes(active_crew_code, person, trades_by_syscodes, laborgroups_by_syscodes, EXCLUDED_CREW_CODES)
+    return time.perf_counter() - start
+
+
+def bench_get_crew_update(impl, employees, active_crew_codes, persons, catalog):
+    get_crew_update = impl.get_crew_update
+    trades_by_syscodes, trades_by_codes, laborgroups_by_syscodes, laborgroups_by_codes = catalog
+
+    start = time.perf_counter()
+    for active_crew_code, person in zip(active_crew_codes, persons):
+        get_crew_update(active_crew_code, person, trades_by_syscodes, trades_by_codes, laborgroups_by_syscodes, laborgroups_by_codes, EXCLUDED_CREW_CODES)
+    return time.perf_counter() - start
+
+
+BENCHMARKS = {
+    "get_active_facilities_crew_code": bench_get_active_facilities_crew_code,
+    "compare_crewcodes": bench_compare_crewcodes,
+    "get_crew_update": bench_get_crew_update,
+}
+
+# *******************************************************************************
+# run / check
+# *******************************************************************************
+
+def run(sizes: list[int], repeats: int = REPEATS) -> dict[str, float]:
+    """Returns the median of the passes, as the time of ipaas.utils over the time of the reference, keyed "function@size"."""
+    results = {}
+    for size in sizes:
+        data = synthetic_data(size)
+        size_repeats = max(repeats, MIN_RECORDS_PER_BENCHMARK // size)
+        for name, benchmark in BENCHMARKS.items():
+            benchmark(utils, *data)  # warm up
+            benchmark(reference_crewcodes, *data)
+
+            # alternate, and swap which side goes first, so both see the same host speed and caches
+            ratios, seconds = [], []
+            for i in range(size_repeats):
+                if i % 2:
+                    current = benchmark(utils, *data)
+                    reference = benchmark(reference_crewcodes, *data)
+                else:
+                    reference = benchmark(reference_crewcodes, *data)
+                    current = benchmark(utils, *data)
+                ratios.append(current / reference)
+                seconds.append(current)
+
+            results[f"{name}@{size}"] = round(statistics.median(ratios), 2)
+            log.info(f"{name:<34} {size:>9} records {statistics.median(seconds) / size * 1e9:>9.1f} ns/record {results[f'{name}@{size}']:>7} x reference")
+
+    return results
+
+
+def check(results: dict[str, float], baselines: dict[str, float], threshold: float) -> list[str]:
+    """Returns the regressions, benchmarks more than threshold slower than their baseline."""
+    regressions = []
+    for key, relative in results.items():
+        baseline = baselines.get(key)
+        if baseline is None:
+            log.warning(f"No baseline for {key}, run with --save to store one")
+            continue
+
+        if relative > baseline * (1 + threshold):
+            regressions.append(f"{key}: {relative} x reference, baseline {baseline} x reference")
+
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for the crew code extraction and compare hot paths")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES), help="number of synthetic records per run")
+    parser.add_argument("--repeats", type=int, default=REPEATS, help="minimum reference and current pass pairs per benchmark, the median ratio is kept")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="allowed slowdown per record for --check, 0.25 = 25%%")
+    parser.add_argument("--save", action="store_true", help=f"store the results in {BASELINES_FILE}")
+    parser.add_argument("--check", action="store_true", help="exit 1 if any benchmark regressed past the threshold")
+
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = run(args.sizes, args.repeats)
+
+    if args.save:
+        with open(BASELINES_FILE, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        log.info(f"Baselines saved to {BASELINES_FILE}")
+
+    if args.check:
+        with open(BASELINES_FILE, "r") as f:
+            baselines = json.load(f)
+
+        regressions = check(results, baselines, args.threshold)
+        for regression in regressions:
+            log.error(f"Regression {regression}")
+        if regressions:
+            sys.exit(1)
+
+        log.info("No regressions")
+
+    sys.exit(os.EX_OK)
+
+
+if __name__ == "__main__":
+    main()
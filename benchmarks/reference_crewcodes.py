@@ -0,0 +1,100 @@
+import logging
+from typing import Any
+
+from ipaas import utils
+
+# *********************************************************************
+# LOGGING - set of log messages
+# *********************************************************************
+
+log = logging.getLogger(__name__)
+
+# *********************************************************************
+# REFERENCE IMPLEMENTATIONS
+# Frozen copies of the ipaas.utils hot paths as they were when baselines.json was saved.
+# bench_crewcodes times ipaas.utils against these in the same process, so a baseline is a
+# ratio that holds on any host. Don't edit them; re-save the baselines after replacing them.
+# *********************************************************************
+
+excluded_crew_codes = utils.excluded_crew_codes
+
+
+def get_active_facilities_crew_code(employee: dict[str, Any]) -> str:
+    if not isinstance(employee, dict):
+        raise TypeError(
+            f"Expected 'employee' to be a dictionary, but got {type(employee)}"
+        )
+
+    active_crew_codes = set()
+
+    if employee["jobs"] is None:
+        log.debug(f"employee with netid '{employee['netid']}' has no jobs")
+        return ""
+
+    for job in employee.get("jobs", []):
+        if (
+            "maintenance_crew" in job
+            and job["maintenance_crew"]["crew_code"] is not None
+            and job["maintenance_crew"]["crew_code"] not in excluded_crew_codes
+            and job["job_current_status"] == "Active"
+        ):
+            active_crew_codes.add(job["maintenance_crew"]["crew_code"])
+
+    if len(set(active_crew_codes)) > 1:
+        raise ValueError(
+            f"employee with netid '{employee['netid']}' has multiple active crew codes: {active_crew_codes}"
+        )
+
+    active_crew_code = active_crew_codes.pop() if active_crew_codes else ""
+
+    return active_crew_code
+
+
+def compare_crewcodes(active_crew_code, pln_person, pln_trades_by_syscodes, pln_laborgroups_by_syscodes, excluded_crew_codes):
+    ipaas_trade = (
+        active_crew_code if active_crew_code not in excluded_crew_codes else ""
+    )
+
+    ipaas_laborgroup = (
+        active_crew_code if active_crew_code not in excluded_crew_codes else ""
+    )
+
+    pln_person_trade = (
+        pln_trades_by_syscodes.get(pln_person.TradeRef) if pln_person.TradeRef else ""
+    )
+
+    pln_person_laborgroup = (
+        pln_laborgroups_by_syscodes.get(pln_person.WorkingHoursTariffGroupRef)
+        if pln_person.WorkingHoursTariffGroupRef
+        else ""
+    )
+
+    pln_trade_code = pln_person_trade.Code if pln_person_trade else ""
+    pln_laborgroup_code = pln_person_laborgroup.Code if pln_person_laborgroup else ""
+
+    return ipaas_trade, ipaas_laborgroup, pln_trade_code, pln_laborgroup_code
+
+
+def get_crew_update(active_crew_code, pln_person, pln_trades_by_syscodes, pln_trades_by_codes, pln_laborgroups_by_syscodes, pln_laborgroups_by_codes, excluded_crew_codes):
+    ipaas_trade, ipaas_labor_group, pln_trade_code, pln_laborgroup_code = compare_crewcodes(active_crew_code, pln_person, pln_trades_by_syscodes, pln_laborgroups_by_syscodes, excluded_crew_codes)
+
+    ipaas_trade = '' if ipaas_trade is None else ipaas_trade
+    ipaas_labor_group = '' if ipaas_labor_group is None else ipaas_labor_group
+
+    person_ipaas = {
+        "trade": ipaas_trade,
+        "labor_group": ipaas_labor_group
+    }
+
+    person_pln = {
+        "trade": pln_trade_code if pln_trade_code else "",
+        "labor_group": pln_laborgroup_code if pln_laborgroup_code else ""
+    }
+
+    pln_trade = pln_trades_by_codes[active_crew_code] if active_crew_code else ""
+    pln_laborgroup = pln_laborgroups_by_codes[active_crew_code] if active_crew_code else ""
+
+    trade_ref = pln_trade.Syscode if pln_trade else None
+    laborgroup_ref = pln_laborgroup.Syscode if pln_laborgroup else None
+
+    return person_ipaas != person_pln, trade_ref, laborgroup_ref
@@ -0,0 +1,139 @@
+import os
+import sys
+import time
+import logging
+import argparse
+import subprocess
+
+from ipaas import sharding
+
+# *********************************************************************
+# LOGGING
+# *********************************************************************
+
+log_level = os.environ.get("LOG_LEVEL", "INFO")
+log_format = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+logging.basicConfig(stream=sys.stdout, level=log_level, format=log_format)
+
+# Set the log to use GMT time zone
+logging.Formatter.converter = time.gmtime
+
+# Add milliseconds
+logging.Formatter.default_msec_format = "%s.%03d"
+
+log = logging.getLogger(__name__)
+
+# *********************************************************************
+# COORDINATOR
+# run   - launch N local main.py workers, one per shard, and merge their results
+# merge - merge results files written by main.py --results-file on separate nodes
+#
+# python coordinator.py run --shards 4
+# python coordinator.py run --shards 4 -- --resume  (worker arguments after --)
+# python coordinator.py merge results/shard-*.json
+# *********************************************************************
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run or merge sharded crew code syncs")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="launch one local main.py worker per shard")
+    run_parser.add_argument("--shards", type=int, required=True, help="number of shards / worker processes")
+    run_parser.add_argument("--results-dir", default="results", help="directory for the per-shard results files")
+    run_parser.add_argument("worker_args", nargs=argparse.REMAINDER, help="extra arguments passed to every main.py worker")
+
+    merge_parser = subparsers.add_parser("merge", help="merge per-shard results files into one report")
+    merge_parser.add_argument("results_files", nargs="+", help="results files written by main.py --results-file")
+
+    return parser.parse_args(argv)
+
+# *********************************************************************
+# run_shards - one subprocess per shard, all started before any is awaited
+# *********************************************************************
+
+def run_shards(shards: int, results_dir: str, worker_args: list[str]) -> list[dict | None]:
+    os.makedirs(results_dir, exist_ok=True)
+
+    workers = []
+    for index in range(shards):
+        results_file = os.path.join(results_dir, f"shard-{index}-of-{shards}.json")
+        if os.path.exists(results_file):
+            os.remove(results_file)  # never merge a stale file from a previous run
+
+        command = [sys.executable, "main.py", "--shard", f"{index}/{shards}", "--results-file", results_file, *worker_args]
+        log.info(f"Starting shard {index}/{shards}")
+        workers.append((index, results_file, subprocess.Popen(command)))
+
+    shard_results = []
+    for index, results_file, worker in workers:
+        returncode = worker.wait()
+        log.info(f"Shard {index}/{shards} exited with {returncode}")
+
+        if os.path.exists(results_file):
+            shard_results.append(sharding.read_results(results_file))
+        else:
+            log.error(f"Shard {index}/{shards} did not write {results_file}")
+            shard_results.append(None)
+
+    return shard_results
+
+
+def read_shards(results_files: list[str]) -> list[dict | None]:
+    shard_results = []
+    for results_file in results_files:
+        try:
+            shard_results.append(sharding.read_results(results_file))
+        except (OSError, ValueError) as ex:
+            log.error(f"Failed to read {results_file} due to {ex}")
+            shard_results.append(None)
+
+    return shard_results
+
+# ****************************************************************************************************************
+# MAIN
+# ****************************************************************************************************************
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.command == "run":
+        worker_args = [arg for arg in args.worker_args if arg != "--"]
+        shard_results = run_shards(args.shards, args.results_dir, worker_args)
+    else:
+        shard_results = read_shards(args.results_files)
+
+    merged = sharding.merge_results(shard_results)
+
+    log.info(
+        f"""Logging merged results\n
+    # ======================= RESULTS ======================= #
+
+    SHARDS:
+    Shards merged: {len(merged["shards"])} of {len(shard_results)} \n
+
+    UPDATED:
+    Employees updated with trade and labor group: {len(merged["updated"])} {merged["updated"]} \n
+
+    SKIPPED:
+    Employees skipped : {len(merged["skipped"])} \n
+
+    STALE:
+    Planon persons with a crew iPaaS no longer gives: {len(merged["stale"])} {merged["stale"]} \n
+    Cleared: {len(merged["cleared"])} \n
+
+    DEFERRED:
+    Writes left when the run was stopped: {len(merged["deferred"])} {merged["deferred"]} \n
+
+    FAILED:
+    Employees failed updating: {len(merged["failed"])} {merged["failed"]}\n
+
+    """
+    )
+
+    sys.exit(merged["exit_code"])
+
+# ****************************************************************************************************************
+# main() allows to execute code When the file Runs as a Script, but not when its imported as a Module
+if __name__ == "__main__":
+    main()
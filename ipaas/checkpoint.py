@@ -0,0 +1,152 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Any, Callable
+
+# *********************************************************************
+# LOGGING - set of log messages
+# *********************************************************************
+
+log = logging.getLogger(__name__)
+
+# *********************************************************************
+# SETUP
+# journal.jsonl - one line per netid already applied, with its input hash
+# <name>.json   - persisted fetch results, with the time they were fetched
+# *********************************************************************
+
+JOURNAL_FILE = "journal.jsonl"
+MAX_SNAPSHOT_AGE = 3600  # seconds a persisted fetch can be reused by --resume
+
+# *******************************************************************************
+# input_hash
+# Hash of everything an update for a netid is computed from on the iPaaS side.
+# Planon is re-read on resume, so its before-state is not part of the hash:
+# after an update it no longer matches what the update was computed from.
+# *******************************************************************************
+
+def input_hash(dart_employee: dict[str, Any], excluded_crew_codes: list[str]) -> str:
+    """Returns a stable hash of the inputs an update for the employee is computed from.
+
+    Args:
+        dart_employee (dict): employee record from iPaaS
+        excluded_crew_codes (list[str]): crew codes excluded from Planon
+
+    Returns:
+        str: hex digest, the same for the same netid, jobs and excluded crew codes
+    """
+    inputs = {
+        "netid": dart_employee["netid"],
+        "jobs": dart_employee.get("jobs"),
+        "excluded_crew_codes": sorted(excluded_crew_codes),
+    }
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode()).hexdigest()
+
+# *******************************************************************************
+# Checkpoint
+# *******************************************************************************
+
+class Checkpoint:
+    """Checkpoint journal and persisted fetch results for a resumable run.
+
+    A fresh run calls reset(), a --resume run keeps what the previous run left.
+    Each applied netid is appended to the journal and flushed to disk right away,
+    so a run killed halfway through the save loop loses at most the write in flight.
+    """
+
+    def __init__(self, directory: str, max_snapshot_age: float = MAX_SNAPSHOT_AGE):
+        self.directory = directory
+        self.max_snapshot_age = max_snapshot_age
+        self.journal_path = os.path.join(directory, JOURNAL_FILE)
+
+        os.makedirs(directory, exist_ok=True)
+
+    def reset(self) -> None:
+        """Removes the journal and every persisted fetch, for a fresh run."""
+        for file_name in os.listdir(self.directory):
+            if file_name == JOURNAL_FILE or file_name.endswith(".json"):
+                os.remove(os.path.join(self.directory, file_name))
+
+    # JOURNAL
+
+    def applied(self) -> dict[str, dict[str, str]]:
+        """Returns the journal as {netid: {"hash": ..., "status": ...}}, last entry wins."""
+        entries = {}
+        if not os.path.exists(self.journal_path):
+            return entries
+
+        with open(self.journal_path, "r") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # the last line is torn if the run died while writing it
+                    log.warning(f"Ignoring torn journal line in {self.journal_path}")
+                    continue
+                entries[entry["netid"]] = {"hash": entry["hash"], "status": entry["status"]}
+
+        return entries
+
+    def record(self, netid: str, inputs_hash: str, status: str) -> None:
+        """Appends an applied netid to the journal and flushes it to disk."""
+        line = json.dumps({"netid": netid, "hash": inputs_hash, "status": status}) + "\n"
+
+        with open(self.journal_path, "ab+") as f:
+            # a torn last line from a run that died while writing it would swallow this entry,
+            # so it is ended first and stays a line of its own that applied() ignores
+            if f.seek(0, os.SEEK_END) > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    line = "\n" + line
+            f.write(line.encode())
+            f.flush()
+            os.fsync(f.fileno())
+
+    # PERSISTED FETCH RESULTS
+
+    def load(self, name: str, params: dict[str, Any] | None = None) -> Any | None:
+        """Returns the persisted fetch result, or None if missing, older than max_snapshot_age or fetched with other params.
+
+        Args:
+            name (str): name of the fetch, e.g. dart_employees
+            params (dict): JSON values the fetch depends on, e.g. the netids and shard of the run
+        """
+        path = os.path.join(self.directory, f"{name}.json")
+        if not os.path.exists(path):
+            return None
+
+        with open(path, "r") as f:
+            snapshot = json.load(f)
+
+        if snapshot.get("params") != params:
+            log.info(f"Persisted {name} was fetched with {snapshot.get('params')}, not {params}, fetching again")
+            return None
+
+        age = time.time() - snapshot["fetched_at"]
+        if age > self.max_snapshot_age:
+            log.info(f"Persisted {name} is {age:.0f}s old, fetching again")
+            return None
+
+        log.info(f"Reusing persisted {name} fetched {age:.0f}s ago")
+        return snapshot["data"]
+
+    def save(self, name: str, data: Any, params: dict[str, Any] | None = None) -> None:
+        path = os.path.join(self.directory, f"{name}.json")
+
+        # write then rename, so a killed run never leaves a half written snapshot
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"fetched_at": time.time(), "params": params, "data": data}, f)
+        os.replace(tmp_path, path)
+
+    def fetch(self, name: str, fetch: Callable[[], Any], resume: bool, params: dict[str, Any] | None = None) -> Any:
+        """Returns the persisted fetch result when resuming, fresh enough and fetched with the same params,
+        otherwise calls fetch() and persists it with the params."""
+        data = self.load(name, params) if resume else None
+        if data is None:
+            data = fetch()
+            self.save(name, data, params)
+
+        return data
@@ -0,0 +1,305 @@
+import json
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, NamedTuple
+
+from ipaas import utils
+
+# *********************************************************************
+# LOGGING - set of log messages
+# *********************************************************************
+
+log = logging.getLogger(__name__)
+
+# *********************************************************************
+# SETUP
+# *********************************************************************
+
+HOST = "127.0.0.1"
+PORT = 8080
+REFRESH_INTERVAL = 900  # seconds between refreshes of the warm crew code catalog and person index
+
+# *******************************************************************************
+# WARM STATE
+# Catalog    - Planon trades & labor groups by codes and syscodes, as main.get_planon_data()
+# SlimPerson - only the Planon person fields a reconciliation reads
+# *******************************************************************************
+
+class Catalog(NamedTuple):
+    trades_by_syscodes: dict
+    trades_by_codes: dict
+    laborgroups_by_syscodes: dict
+    laborgroups_by_codes: dict
+
+
+class SlimPerson(NamedTuple):
+    Syscode: int
+    NetID: str
+    TradeRef: int | None
+    WorkingHoursTariffGroupRef: int | None
+
+
+def slim_person(pln_person: Any) -> SlimPerson:
+    return SlimPerson(pln_person.Syscode, pln_person.NetID, pln_person.TradeRef, pln_person.WorkingHoursTariffGroupRef)
+
+
+class WarmState:
+    """Crew code catalog and Planon person index kept in memory, refreshed periodically.
+
+    load() returns a fresh (Catalog, {netid: SlimPerson}) and is called from a
+    background thread; readers always see a complete catalog and index, never a
+    half refreshed one. Persons set while a load runs are newer than its snapshot,
+    so they are applied on top of it.
+    """
+
+    def __init__(self, load: Callable[[], tuple[Catalog, dict[str, SlimPerson]]], refresh_interval: float = REFRESH_INTERVAL):
+        self.load = load
+        self.refresh_interval = refresh_interval
+        self.catalog: Catalog | None = None
+        self.persons: dict[str, SlimPerson] = {}
+        self.refreshed_at: float | None = None
+
+        self._lock = threading.Lock()
+        self._set_during_load: dict[str, SlimPerson] | None = None
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def refresh(self) -> None:
+        with self._lock:
+            self._set_during_load = {}
+
+        try:
+            catalog, persons = self.load()
+            with self._lock:
+                persons.update(self._set_during_load)
+                self.catalog, self.persons = catalog, persons
+                self.refreshed_at = time.time()
+        finally:
+            with self._lock:
+                self._set_during_load = None
+
+        log.info(f"Warm state refreshed, {len(persons)} Planon persons")
+
+    def start(self) -> None:
+        self.refresh()
+        self._thread = threading.Thread(target=self._refresh_loop, name="warm-state-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _refresh_loop(self) -> None:
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except Exception as ex:
+                # keep serving from the previous state until Planon is back
+                log.exception(f"Failed to refresh warm state due to {ex}")
+
+    def get(self, netid: str) -> tuple[Catalog, SlimPerson | None]:
+        with self._lock:
+            return self.catalog, self.persons.get(netid)
+
+    def set_person(self, person: SlimPerson) -> None:
+        with self._lock:
+            self.persons[person.NetID] = person
+            if self._set_during_load is not None:
+                self._set_during_load[person.NetID] = person
+
+# *******************************************************************************
+# DAEMON
+# POST /events    {"netid": "..."} or {"netids": [...]} - queue reconciliations, 202
+# POST /reconcile {"netid": "..."}                      - reconcile now, 200 with the result
+# GET  /health                                          - warm state and queue size
+# *******************************************************************************
+
+class Daemon:
+    """Long running reconciliation of single employees, driven by employee-changed events.
+
+    Args:
+        state (WarmState): warm catalog and person index
+        fetch_employee (Callable): netid -> iPaaS employee record, or None if not in the HR feed
+        apply_update (Callable): (SlimPerson, trade_ref, laborgroup_ref) -> None, writes to Planon
+        excluded_crew_codes (list[str]): crew codes that should not get updated in Planon
+        find_person (Callable): netid -> SlimPerson from Planon, or None; looks up persons missing
+            from the warm index, e.g. created since the last refresh. None to report them not_found
+    """
+
+    def __init__(
+        self,
+        state: WarmState,
+        fetch_employee: Callable[[str], dict[str, Any] | None],
+        apply_update: Callable[[SlimPerson, int | None, int | None], None],
+        excluded_crew_codes: list[str],
+        host: str = HOST,
+        port: int = PORT,
+        find_person: Callable[[str], SlimPerson | None] | None = None,
+    ):
+        self.state = state
+        self.fetch_employee = fetch_employee
+        self.apply_update = apply_update
+        self.excluded_crew_codes = excluded_crew_codes
+        self.find_person = find_person
+
+        self.queue: queue.Queue[str] = queue.Queue()
+        self._pending: set[str] = set()
+        self._pending_lock = threading.Lock()
+
+        # the worker and /reconcile requests can reconcile the same netid at once
+        self._netid_locks: dict[str, tuple[threading.Lock, int]] = {}
+        self._netid_locks_lock = threading.Lock()
+
+        self.server = ThreadingHTTPServer((host, port), _EventHandler)
+        self.server.reconciler = self
+
+    @property
+    def address(self) -> tuple[str, int]:
+        return self.server.server_address[:2]
+
+    def submit(self, netid: str) -> bool:
+        """Queues a reconciliation, unless one for the netid is already waiting."""
+        with self._pending_lock:
+            if netid in self._pending:
+                return False
+            self._pending.add(netid)
+
+        self.queue.put(netid)
+        return True
+
+    @contextmanager
+    def _netid_lock(self, netid: str):
+        """Holds the lock of one netid, it is dropped when no one holds or waits for it."""
+        with self._netid_locks_lock:
+            lock, holders = self._netid_locks.get(netid, (threading.Lock(), 0))
+            self._netid_locks[netid] = (lock, holders + 1)
+
+        try:
+            with lock:
+                yield
+        finally:
+            with self._netid_locks_lock:
+                lock, holders = self._netid_locks[netid]
+                if holders == 1:
+                    del self._netid_locks[netid]
+                else:
+                    self._netid_locks[netid] = (lock, holders - 1)
+
+    def reconcile(self, netid: str) -> str:
+        """Reconciles one employee against the warm state and returns updated, skipped or not_found.
+
+        Reconciliations of the same netid run one at a time, so the second one reads the
+        person the first one wrote instead of writing again from a stale read.
+        """
+        with self._netid_lock(netid):
+            return self._reconcile(netid)
+
+    def _reconcile(self, netid: str) -> str:
+        catalog, pln_person = self.state.get(netid)
+        if pln_person is None and self.find_person:
+            # created in Planon since the last refresh, or the event came first
+            pln_person = self.find_person(netid)
+            if pln_person is not None:
+                self.state.set_person(pln_person)
+        if pln_person is None:
+            log.warning(f"Record {netid} not found in Planon")
+            return "not_found"
+
+        dart_employee = self.fetch_employee(netid)
+        if dart_employee is None:
+            log.warning(f"Record {netid} not found in iPaaS")
+            return "not_found"
+
+        active_crew_code = utils.get_active_facilities_crew_code(dart_employee)
+        needs_update, trade_ref, laborgroup_ref = utils.get_crew_update(
+            active_crew_code,
+            pln_person,
+            catalog.trades_by_syscodes,
+            catalog.trades_by_codes,
+            catalog.laborgroups_by_syscodes,
+            catalog.laborgroups_by_codes,
+            self.excluded_crew_codes,
+        )
+
+        if not needs_update:
+            log.debug(f"Record {netid} skipped, already has the correct trade & labor group for {active_crew_code}")
+            return "skipped"
+
+        self.apply_update(pln_person, trade_ref, laborgroup_ref)
+        self.state.set_person(pln_person._replace(TradeRef=trade_ref, WorkingHoursTariffGroupRef=laborgroup_ref))
+
+        log.info(f"Record {netid} updated with {active_crew_code}")
+        return "updated"
+
+    def _work(self) -> None:
+        while True:
+            netid = self.queue.get()
+            with self._pending_lock:
+                self._pending.discard(netid)
+
+            try:
+                self.reconcile(netid)
+            except Exception as ex:
+                log.exception(f"Failed to update {netid} due to {ex}")
+            finally:
+                self.queue.task_done()
+
+    def start(self) -> None:
+        """Starts the worker and the HTTP server in background threads."""
+        threading.Thread(target=self._work, name="reconcile-worker", daemon=True).start()
+        # a short poll interval so stop() returns promptly
+        threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.05}, name="event-server", daemon=True).start()
+        log.info(f"Listening for employee-changed events on http://{self.address[0]}:{self.address[1]}")
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        self.state.stop()
+
+
+class _EventHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path != "/health":
+            return self._reply(404, {"error": f"Unknown path {self.path}"})
+
+        daemon: Daemon = self.server.reconciler
+        self._reply(200, {"persons": len(daemon.state.persons), "refreshed_at": daemon.state.refreshed_at, "queued": daemon.queue.qsize()})
+
+    def do_POST(self):
+        daemon: Daemon = self.server.reconciler
+
+        try:
+            event = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            netids = event["netids"] if "netids" in event else [event["netid"]]
+        except (ValueError, KeyError, TypeError):
+            return self._reply(400, {"error": 'Expected {"netid": ...} or {"netids": [...]}'})
+
+        if self.path == "/events":
+            queued = sum(daemon.submit(netid) for netid in netids)
+            self._reply(202, {"queued": queued})
+        elif self.path == "/reconcile":
+            results = {}
+            for netid in netids:
+                try:
+                    results[netid] = daemon.reconcile(netid)
+                except Exception as ex:
+                    log.exception(f"Failed to update {netid} due to {ex}")
+                    results[netid] = f"failed: {ex}"
+            self._reply(200, results)
+        else:
+            self._reply(404, {"error": f"Unknown path {self.path}"})
+
+    def _reply(self, status: int, body: dict[str, Any]) -> None:
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        log.debug(format % args)
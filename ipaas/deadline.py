@@ -0,0 +1,117 @@
+import logging
+import time
+from typing import Any, NamedTuple
+
+import requests
+
+# *********************************************************************
+# LOGGING - set of log messages
+# *********************************************************************
+
+log = logging.getLogger(__name__)
+
+# *********************************************************************
+# SETUP
+# *********************************************************************
+
+# write priorities, lower first: a new crew matters more than clearing an old one
+NEW_CREW = 0
+CLEAR_CREW = 1
+CLEAR_STALE_CREW = 2
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+# *******************************************************************************
+# PendingWrite - an update the compare found, not yet sent to Planon
+# *******************************************************************************
+
+class PendingWrite(NamedTuple):
+    priority: int
+    netid: str
+    pln_person: Any
+    trade_ref: int | None
+    laborgroup_ref: int | None
+    inputs_hash: str | None = None  # None for stale crews, they have no iPaaS inputs to journal
+    active_crew_code: str = ""
+
+
+def pending_write(netid: str, pln_person: Any, trade_ref: int | None, laborgroup_ref: int | None, inputs_hash: str, active_crew_code: str) -> PendingWrite:
+    priority = NEW_CREW if trade_ref is not None or laborgroup_ref is not None else CLEAR_CREW
+    return PendingWrite(priority, netid, pln_person, trade_ref, laborgroup_ref, inputs_hash, active_crew_code)
+
+
+def prioritized(writes: list[PendingWrite]) -> list[PendingWrite]:
+    """Orders writes by priority, and by netid within a priority so reruns apply them in the same order."""
+    return sorted(writes, key=lambda write: (write.priority, write.netid))
+
+# *******************************************************************************
+# Deadline
+# One budget for the whole run, shared by every HTTP call and the apply loop
+# A stop (SIGTERM) is checked at the same places, so a write in flight always finishes
+# *******************************************************************************
+
+class Deadline:
+    """Time budget of a run.
+
+    Args:
+        seconds (float): budget from now, None for no deadline
+    """
+
+    def __init__(self, seconds: float | None = None):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds if seconds is not None else None
+        self.stopped_by: str | None = None
+
+    def stop(self, reason: str) -> None:
+        """Stops the run at the next check, e.g. on SIGTERM."""
+        log.warning(f"Stopping the run: {reason}")
+        self.stopped_by = reason
+
+    def remaining(self) -> float | None:
+        """Seconds left, None without a deadline."""
+        if self.expires_at is None:
+            return None
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    @property
+    def expired(self) -> bool:
+        return self.stopped_by is not None or self.remaining() == 0.0
+
+    def reason(self) -> str:
+        return self.stopped_by or f"deadline of {self.seconds}s exceeded"
+
+    def check(self) -> None:
+        """Raises DeadlineExceeded once the run is out of time or stopped."""
+        if self.expired:
+            raise DeadlineExceeded(self.reason())
+
+    def bind(self, session: requests.Session, cap_timeout: bool = True) -> requests.Session:
+        """Checks the deadline before every request of the session, and caps its timeout at the time left.
+
+        Args:
+            session (requests.Session): session to bind
+            cap_timeout (bool): False for writes, a request sent before the deadline runs to completion
+        """
+        send = session.send
+
+        def send_within_deadline(request: requests.PreparedRequest, **kwargs: Any) -> requests.Response:
+            self.check()
+            remaining = self.remaining()
+            timeout = kwargs.get("timeout")
+            if cap_timeout and remaining is not None:
+                if isinstance(timeout, tuple):  # (connect, read)
+                    kwargs["timeout"] = tuple(remaining if part is None else min(part, remaining) for part in timeout)
+                elif timeout is None or timeout > remaining:
+                    kwargs["timeout"] = remaining
+            try:
+                return send(request, **kwargs)
+            except requests.Timeout as ex:
+                # the capped timeout is how the deadline ends a request, not a failure of the endpoint
+                if self.expired:
+                    raise DeadlineExceeded(self.reason()) from ex
+                raise
+
+        session.send = send_within_deadline
+        return session
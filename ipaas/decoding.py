@@ -0,0 +1,163 @@
+import json
+import logging
+from typing import Any, Callable, TypedDict
+
+from typing_extensions import NotRequired
+
+# msgspec and orjson are optional, the stdlib json module is the fallback
+try:
+    import msgspec
+except ImportError:  # pragma: no cover
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+# *********************************************************************
+# LOGGING - set of log messages
+# *********************************************************************
+
+log = logging.getLogger(__name__)
+
+# *******************************************************************************
+# TYPED EMPLOYEES
+# Only the fields get_active_facilities_crew_code(), main() and EmployeeQuery read:
+# netid, last_updated, jobs, jobs[].job_current_status and jobs[].maintenance_crew.crew_code
+# Keys missing from the response stay missing, so lookups fail exactly like they
+# would on the full record. last_updated is only compared by a client-side
+# changed_since, so any value is kept; a record with a mistyped field main reads
+# is skipped and logged by every decoder, the rest of the page is kept
+# *******************************************************************************
+
+class MaintenanceCrew(TypedDict):
+    crew_code: NotRequired[str | None]
+
+
+class Job(TypedDict):
+    job_current_status: NotRequired[str | None]
+    maintenance_crew: NotRequired[MaintenanceCrew | None]
+
+
+class Employee(TypedDict):
+    netid: str
+    last_updated: NotRequired[Any]
+    jobs: NotRequired[list[Job] | None]
+
+# *******************************************************************************
+# DECODERS - bytes of one iPaaS page (a JSON list) into a list of Employee
+# msgspec  - schema driven, unknown fields are skipped while parsing, never materialized
+# orjson   - fast generic parse, then only the typed fields are kept
+# json     - stdlib generic parse, then only the typed fields are kept
+# *******************************************************************************
+
+def slim_employee(employee: dict[str, Any]) -> Employee:
+    """Returns the employee with only the typed fields.
+
+    Raises:
+        TypeError: if a field main reads doesn't have its Employee type, like msgspec would
+    """
+    if not isinstance(employee, dict) or not isinstance(employee.get("netid"), str):
+        raise TypeError("Expected an object with a str `netid`")
+
+    slim: dict[str, Any] = {"netid": employee["netid"]}
+
+    if "last_updated" in employee:
+        slim["last_updated"] = employee["last_updated"]
+
+    if "jobs" in employee:
+        jobs = employee["jobs"]
+        if jobs is not None and not isinstance(jobs, list):
+            raise TypeError("Expected `jobs` to be an array or null")
+        slim["jobs"] = None if jobs is None else [slim_job(job) for job in jobs]
+
+    return slim
+
+
+def slim_job(job: dict[str, Any]) -> Job:
+    if not isinstance(job, dict):
+        raise TypeError("Expected each job to be an object")
+
+    slim: dict[str, Any] = {}
+
+    if "job_current_status" in job:
+        slim["job_current_status"] = optional_str(job["job_current_status"], "job_current_status")
+
+    if "maintenance_crew" in job:
+        maintenance_crew = job["maintenance_crew"]
+        if maintenance_crew is None:
+            slim["maintenance_crew"] = None
+        elif not isinstance(maintenance_crew, dict):
+            raise TypeError("Expected `maintenance_crew` to be an object or null")
+        else:
+            slim["maintenance_crew"] = {"crew_code": optional_str(maintenance_crew["crew_code"], "crew_code")} if "crew_code" in maintenance_crew else {}
+
+    return slim
+
+
+def optional_str(value: Any, field: str) -> str | None:
+    if value is not None and not isinstance(value, str):
+        raise TypeError(f"Expected `{field}` to be a str or null")
+    return value
+
+
+def slim_employees(employees: list[Any]) -> list[Employee]:
+    """Returns the slim employees of a page, skipping and logging the mistyped ones."""
+    slim = []
+    for i, employee in enumerate(employees):
+        try:
+            slim.append(slim_employee(employee))
+        except TypeError as e:
+            log.warning(f"Skipping employee {i} of the page: {e}")
+    return slim
+
+
+def decode_employees_json(content: bytes) -> list[Employee]:
+    return slim_employees(json.loads(content))
+
+
+def decode_employees_orjson(content: bytes) -> list[Employee]:
+    return slim_employees(orjson.loads(content))
+
+
+if msgspec is not None:
+    _employees_decoder = msgspec.json.Decoder(list[Employee])
+    _employee_decoder = msgspec.json.Decoder(Employee)
+    _raw_employees_decoder = msgspec.json.Decoder(list[msgspec.Raw])
+
+    def decode_employees_msgspec(content: bytes) -> list[Employee]:
+        try:
+            return _employees_decoder.decode(content)
+        except msgspec.ValidationError:
+            pass
+
+        # the page has a mistyped record, decode the records one by one to skip it
+        employees = []
+        for i, raw in enumerate(_raw_employees_decoder.decode(content)):
+            try:
+                employees.append(_employee_decoder.decode(raw))
+            except msgspec.ValidationError as e:
+                log.warning(f"Skipping employee {i} of the page: {e}")
+        return employees
+
+
+def decode_employee(content: bytes) -> Employee:
+    """Decodes a single employee, e.g. from {DARTMOUTH_API_URL}/api/employees/{netid}."""
+    if msgspec is not None:
+        return _employee_decoder.decode(content)
+
+    return slim_employee(orjson.loads(content) if orjson is not None else json.loads(content))
+
+
+if msgspec is not None:
+    decode_employees: Callable[[bytes], list[Employee]] = decode_employees_msgspec
+    DECODER = "msgspec"
+elif orjson is not None:
+    decode_employees = decode_employees_orjson
+    DECODER = "orjson"
+else:
+    decode_employees = decode_employees_json
+    DECODER = "json"
+
+log.debug(f"Decoding iPaaS employees with {DECODER}")
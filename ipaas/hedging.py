@@ -0,0 +1,186 @@
+import contextvars
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Callable, TypeVar
+
+# *********************************************************************
+# LOGGING - set of log messages
+# *********************************************************************
+
+log = logging.getLogger(__name__)
+
+# *********************************************************************
+# SETUP
+# *********************************************************************
+
+PERCENTILE = 0.95  # hedge a request once it is slower than this percentile of its recent latencies
+MIN_SAMPLES = 10  # latencies needed per key before the percentile is trusted, initial_delay until then
+WINDOW = 200  # recent latencies kept per key
+INITIAL_DELAY = 10.0  # seconds before hedging a key without enough samples, None never hedges it
+MIN_DELAY = 0.05  # never hedge sooner than this, whatever the percentile says
+MAX_EXTRA_RATIO = 0.1  # at most 10% extra requests...
+BURST = 1  # ...plus this many, so a short run can still hedge its one slow call
+
+T = TypeVar("T")
+
+# *******************************************************************************
+# HedgePolicy
+# Only for idempotent reads: iPaaS GET pages and Planon find()
+# A hedge can't stop a request already on the wire, the slower response is
+# discarded (cleanup closes it) and never returned
+# Attempts run on daemon threads, so exiting never waits for a discarded one, in a
+# copy of the caller's context, so its trace thread and tags carry over
+# *******************************************************************************
+
+class HedgePolicy:
+    """Fires a duplicate of a slow idempotent request and takes whichever response arrives first.
+
+    Latencies are tracked per key (e.g. "GET /api/employees", "Person.find"), so a
+    slow kind of call doesn't raise the threshold of a fast one. The number of
+    hedges is capped at max_extra_ratio of all requests plus burst, so when a
+    server is slow for everyone hedging stops instead of doubling the load.
+
+    Args:
+        clock (Callable): seconds for timing the attempts, time.perf_counter
+        wait (Callable): waits on the attempts like concurrent.futures.wait, the hedge
+            threshold is its timeout; tests pass one that decides when the threshold passes
+    """
+
+    def __init__(
+        self,
+        percentile: float = PERCENTILE,
+        min_samples: int = MIN_SAMPLES,
+        initial_delay: float | None = INITIAL_DELAY,
+        min_delay: float = MIN_DELAY,
+        max_extra_ratio: float = MAX_EXTRA_RATIO,
+        burst: int = BURST,
+        clock: Callable[[], float] = time.perf_counter,
+        wait: Callable = wait,
+    ):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.max_extra_ratio = max_extra_ratio
+        self.burst = burst
+        self.clock = clock
+        self.wait = wait
+
+        self.latencies: dict[str, deque[float]] = defaultdict(lambda: deque(maxlen=WINDOW))
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def threshold(self, key: str) -> float | None:
+        """Returns the seconds after which a request for the key is hedged, None to never hedge it."""
+        with self._lock:
+            latencies = sorted(self.latencies[key])
+
+        if len(latencies) < self.min_samples:
+            return self.initial_delay
+
+        index = min(int(len(latencies) * self.percentile), len(latencies) - 1)
+        return max(latencies[index], self.min_delay)
+
+    def _record(self, key: str, latency: float) -> None:
+        with self._lock:
+            self.latencies[key].append(latency)
+
+    def _acquire_hedge(self) -> bool:
+        with self._lock:
+            if self.hedges >= int(self.max_extra_ratio * self.requests) + self.burst:
+                return False
+            self.hedges += 1
+            return True
+
+    def _submit(self, fn: Callable[[], T]) -> Future:
+        """Runs fn on a daemon thread, unlike ThreadPoolExecutor whose workers are joined at exit,
+        in a copy of the caller's context variables.
+        """
+        future: Future = Future()
+        context = contextvars.copy_context()
+
+        def attempt():
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                result = fn()
+            except BaseException as ex:
+                future.set_exception(ex)
+            else:
+                future.set_result(result)
+
+        threading.Thread(target=context.run, args=(attempt,), name="hedge", daemon=True).start()
+        return future
+
+    def _timed(self, key: str, fn: Callable[[], T]) -> Callable[[], T]:
+        def timed():
+            start = self.clock()
+            result = fn()
+            self._record(key, self.clock() - start)
+            return result
+
+        return timed
+
+    def run(self, fn: Callable[[], T], key: str = "", cleanup: Callable[[T], None] | None = None) -> T:
+        """Calls fn(), and a duplicate of it if the first call is slower than the threshold for key.
+
+        Args:
+            fn (Callable): the idempotent request, e.g. lambda: session.get(url)
+            key (str): the kind of request, latencies are tracked per key
+            cleanup (Callable): called with the discarded result, e.g. to close a response
+
+        Returns:
+            the first successful result; if every attempt fails, the first attempt's exception is raised
+        """
+        if self._closed:
+            return fn()
+
+        with self._lock:
+            self.requests += 1
+
+        threshold = self.threshold(key)
+        primary = self._submit(self._timed(key, fn))
+
+        done, _ = self.wait([primary], timeout=threshold)
+        if done:
+            return primary.result()
+
+        if not self._acquire_hedge():
+            log.debug(f"Not hedging {key}, {self.hedges} hedges for {self.requests} requests")
+            return primary.result()
+
+        log.info(f"Hedging {key} after {threshold:.3f}s")
+        hedge = self._submit(self._timed(key, fn))
+
+        return self._first_success([primary, hedge], cleanup)
+
+    def _first_success(self, attempts: list[Future], cleanup: Callable | None) -> T:
+        pending = set(attempts)
+        while pending:
+            done, pending = self.wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is attempts[1]:
+                        with self._lock:
+                            self.hedge_wins += 1
+                    self._discard(pending, cleanup)
+                    return future.result()
+
+        return attempts[0].result()
+
+    def _discard(self, futures: set[Future], cleanup: Callable | None) -> None:
+        for future in futures:
+            # not started yet: never sent; already running: its result is cleaned up when it arrives
+            if not future.cancel() and cleanup:
+                future.add_done_callback(lambda f: f.exception() is None and cleanup(f.result()))
+
+    def shutdown(self) -> None:
+        """Stops hedging, later calls run fn() directly. Discarded attempts still running are left to finish or die with the process."""
+        self._closed = True
@@ -0,0 +1,157 @@
+import logging
+from typing import Any, Mapping
+
+# *********************************************************************
+# LOGGING - set of log messages
+# *********************************************************************
+
+log = logging.getLogger(__name__)
+
+# *********************************************************************
+# SETUP
+# *********************************************************************
+
+PAGE_SIZE = 1000
+MIN_PAGE_SIZE = 250
+MAX_PAGE_SIZE = 8000
+TARGET_PAGE_SECONDS = 2.0  # page size is tuned so a page takes about this long...
+MAX_PAGE_BYTES = 8 * 1024 * 1024  # ...and stays under this many bytes
+TOTAL_COUNT_HEADER = "X-Total-Count"  # when the endpoint sends it, the last page is known without an empty one
+KEY = "netid"  # unique key of a record, for duplicates and keyset continuation
+
+
+class PagingError(Exception):
+    pass
+
+# *******************************************************************************
+# Pager
+# Offset pagination (pagesize & page): page N of size S starts at (N - 1) * S, so the
+# page size only changes where the records fetched so far are a multiple of the new size:
+# it doubles or halves, one step per page
+# A page shorter than asked for is the last one, unless the page size was just doubled and
+# the page is at least as long as before: the endpoint caps the page size there, and it is
+# never grown past the cap again
+# Keyset pagination (cursor_param, e.g. netid_gt=<last netid>): any page size, and records
+# added or removed mid-scan don't shift the pages
+# *******************************************************************************
+
+class Pager:
+    """Query parameters of the next page, and what the pages returned so far say about it.
+
+    Args:
+        page_size (int): size of the first page
+        adaptive (bool): tune the page size from the time and bytes of each page
+        cursor_param (str): query parameter for keyset continuation, None for offset pagination
+        key (str): unique key of a record
+    """
+
+    def __init__(
+        self,
+        page_size: int = PAGE_SIZE,
+        adaptive: bool = False,
+        cursor_param: str | None = None,
+        key: str = KEY,
+        min_page_size: int = MIN_PAGE_SIZE,
+        max_page_size: int = MAX_PAGE_SIZE,
+        target_seconds: float = TARGET_PAGE_SECONDS,
+        max_page_bytes: int = MAX_PAGE_BYTES,
+    ):
+        self.page_size = page_size
+        self.adaptive = adaptive
+        self.cursor_param = cursor_param
+        self.key = key
+        self.min_page_size = min_page_size
+        self.max_page_size = max_page_size
+        self.target_seconds = target_seconds
+        self.max_page_bytes = max_page_bytes
+
+        self.fetched = 0  # records returned by the endpoint, duplicates included
+        self.cursor: Any = None
+        self.total: int | None = None
+        self.done = False
+        self.duplicates = 0
+        self.cap: int | None = None  # page size the endpoint was seen capping at
+        self._grown_from: int | None = None  # page size before the last doubling
+        self._seen: set[Any] = set()
+
+    def params(self) -> dict[str, Any]:
+        if self.cursor_param:
+            return {"pagesize": self.page_size, **({self.cursor_param: self.cursor} if self.cursor is not None else {})}
+        return {"pagesize": self.page_size, "page": self.fetched // self.page_size + 1}
+
+    def next_page(self, records: list[dict[str, Any]], seconds: float = 0.0, size: int = 0, headers: Mapping[str, str] | None = None) -> list[dict[str, Any]]:
+        """Takes a decoded page and returns its records that weren't returned before.
+
+        Args:
+            records (list): the decoded page
+            seconds (float): response time of the page
+            size (int): bytes of the page
+            headers (Mapping): response headers, for TOTAL_COUNT_HEADER
+        """
+        total = (headers or {}).get(TOTAL_COUNT_HEADER)
+        if total is not None:
+            self.total = int(total)
+
+        requested = self.page_size
+        grown_from, self._grown_from = self._grown_from, None
+        previous_cursor = self.cursor
+
+        capped = grown_from is not None and grown_from <= len(records) < requested
+        if capped:
+            self.cap = len(records) if self.cursor_param else grown_from
+            log.info(f"Page of {len(records)} records for a page size of {requested}, the endpoint caps the page size at {self.cap}")
+            self.page_size = self.cap
+            if not self.cursor_param:
+                # the endpoint served page N of its own size, which starts before the records fetched so far
+                return []
+
+        self.fetched += len(records)
+        if records:
+            self.cursor = records[-1].get(self.key)
+
+        self.done = not records or (len(records) < requested and not capped) or (self.total is not None and self.fetched >= self.total)
+
+        new_records = []
+        for record in records:
+            key = record.get(self.key)
+            if key is not None and key in self._seen:
+                continue
+            if key is not None:
+                self._seen.add(key)
+            new_records.append(record)
+
+        duplicates = len(records) - len(new_records)
+        if duplicates:
+            self.duplicates += duplicates
+            log.warning(f"{duplicates} duplicate records on the page after {self.fetched - len(records)} records, records moved while paging")
+
+        # an endpoint that ignores the cursor returns the same page forever
+        if self.cursor_param and not self.done and (self.cursor == previous_cursor or not new_records):
+            raise PagingError(f"Keyset pagination with {self.cursor_param} isn't moving forward after {self.cursor}, the endpoint may not support it")
+
+        if self.done and self.total is not None and self.fetched - self.duplicates < self.total:
+            raise PagingError(f"Paging ended with {self.fetched - self.duplicates} records, the endpoint announced {self.total}")
+
+        if self.adaptive and not self.done and records:
+            self._tune(len(records), seconds, size)
+
+        return new_records
+
+    def _tune(self, count: int, seconds: float, size: int) -> None:
+        wanted = self.page_size
+        if seconds > 0:
+            wanted = self.page_size * self.target_seconds / seconds
+        if size > 0:
+            wanted = min(wanted, self.max_page_bytes / (size / count))
+
+        if wanted >= 2 * self.page_size and 2 * self.page_size <= min(self.max_page_size, self.cap or self.max_page_size):
+            # offset pagination: page N of the doubled size must start where this page ended
+            if self.cursor_param or self.fetched % (2 * self.page_size) == 0:
+                self._grown_from = self.page_size
+                self.page_size *= 2
+        elif wanted <= self.page_size / 2 and self.page_size // 2 >= self.min_page_size:
+            self.page_size //= 2
+        else:
+            return
+
+        log.debug(f"Page size tuned to {self.page_size} after {seconds:.3f}s and {size} bytes for {count} records")
@@ -0,0 +1,170 @@
+import logging
+import sqlite3
+import time
+from typing import Any, Callable, NamedTuple
+
+# *********************************************************************
+# LOGGING - set of log messages
+# *********************************************************************
+
+log = logging.getLogger(__name__)
+
+# *********************************************************************
+# SETUP
+# *********************************************************************
+
+# Planon system field with the time a person was last changed, the high-water mark of the mirror
+MODIFIED_FIELD = "SysChangeDateTime"
+FULL_RESYNC_INTERVAL = 86400  # seconds between full resyncs, which also drop persons deleted in Planon
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS persons (
+    Syscode INTEGER PRIMARY KEY,
+    NetID TEXT,
+    TradeRef INTEGER,
+    WorkingHoursTariffGroupRef INTEGER,
+    IsArchived INTEGER NOT NULL DEFAULT 0,
+    Modified TEXT
+);
+CREATE INDEX IF NOT EXISTS persons_netid ON persons (NetID);
+CREATE TABLE IF NOT EXISTS mirror_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# *******************************************************************************
+# MirroredPerson - the Planon person fields the compare stage reads
+# Same attribute names as planon.Person, so utils.compare_crewcodes() takes it as is
+# *******************************************************************************
+
+class MirroredPerson(NamedTuple):
+    Syscode: int
+    NetID: str | None
+    TradeRef: int | None
+    WorkingHoursTariffGroupRef: int | None
+    IsArchived: bool
+    Modified: str | None
+
+
+def mirrored_person(pln_person: Any) -> MirroredPerson:
+    modified = getattr(pln_person, MODIFIED_FIELD, None)
+    return MirroredPerson(
+        pln_person.Syscode,
+        pln_person.NetID,
+        pln_person.TradeRef,
+        pln_person.WorkingHoursTariffGroupRef,
+        bool(getattr(pln_person, "IsArchived", False)),
+        str(modified) if modified is not None else None,
+    )
+
+# *******************************************************************************
+# PlanonMirror
+# *******************************************************************************
+
+class PlanonMirror:
+    """Local SQLite mirror of Planon persons, indexed on NetID.
+
+    refresh() pulls only persons modified at or after the high-water mark, with
+    find({"filter": {MODIFIED_FIELD: {"gte": ...}}}), and does a full resync
+    every full_resync_interval seconds or when the mirror is empty.
+
+    Args:
+        path (str): SQLite database file, ":memory:" for tests
+        full_resync_interval (float): seconds between full resyncs
+    """
+
+    def __init__(self, path: str, full_resync_interval: float = FULL_RESYNC_INTERVAL):
+        self.path = path
+        self.full_resync_interval = full_resync_interval
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.connection.close()
+
+    # MIRROR STATE
+
+    def _get_state(self, key: str) -> str | None:
+        row = self.connection.execute("SELECT value FROM mirror_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_state(self, key: str, value: str) -> None:
+        self.connection.execute("INSERT OR REPLACE INTO mirror_state (key, value) VALUES (?, ?)", (key, value))
+
+    @property
+    def high_water_mark(self) -> str | None:
+        return self._get_state("high_water_mark")
+
+    # REFRESH
+
+    def refresh(self, find: Callable[..., list[Any]], full: bool = False) -> int:
+        """Refreshes the mirror from Planon and returns the number of persons fetched.
+
+        Args:
+            find (Callable): planon.Person.find
+            full (bool): force a full resync
+        """
+        last_full_resync = self._get_state("last_full_resync")
+        if full or self.high_water_mark is None or last_full_resync is None or time.time() - float(last_full_resync) > self.full_resync_interval:
+            return self._full_resync(find)
+
+        # gte: a person changed in the same second as the high-water mark, after the last refresh, isn't missed;
+        # the persons already read at the mark are read again, which INSERT OR REPLACE makes harmless
+        log.info(f"Getting Planon persons modified since {self.high_water_mark}")
+        persons = [mirrored_person(pln_person) for pln_person in find({"filter": {MODIFIED_FIELD: {"gte": self.high_water_mark}}})]
+
+        with self.connection:
+            self._upsert(persons)
+
+        log.info(f"Total number of Planon persons refreshed in the mirror: {len(persons)}")
+        return len(persons)
+
+    def _full_resync(self, find: Callable[..., list[Any]]) -> int:
+        log.info("Getting all Planon persons for a full resync of the mirror")
+        persons = [mirrored_person(pln_person) for pln_person in find()]
+
+        with self.connection:
+            self.connection.execute("DELETE FROM persons")
+            self.connection.execute("DELETE FROM mirror_state WHERE key = 'high_water_mark'")
+            self._upsert(persons)
+            self._set_state("last_full_resync", str(time.time()))
+
+        log.info(f"Total number of Planon persons in the mirror: {len(persons)}")
+        return len(persons)
+
+    def _upsert(self, persons: list[MirroredPerson]) -> None:
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO persons (Syscode, NetID, TradeRef, WorkingHoursTariffGroupRef, IsArchived, Modified) VALUES (?, ?, ?, ?, ?, ?)",
+            persons,
+        )
+
+        modified = [person.Modified for person in persons if person.Modified is not None]
+        if modified and max(modified) > (self.high_water_mark or ""):
+            self._set_state("high_water_mark", max(modified))
+
+    # READ
+
+    def persons(self, include_archived: bool = False) -> dict[str, MirroredPerson]:
+        """Returns mirrored persons that have a NetID, by NetID."""
+        query = "SELECT Syscode, NetID, TradeRef, WorkingHoursTariffGroupRef, IsArchived, Modified FROM persons WHERE NetID IS NOT NULL"
+        if not include_archived:
+            query += " AND IsArchived = 0"
+
+        return {row[1]: MirroredPerson(*row[:4], bool(row[4]), row[5]) for row in self.connection.execute(query)}
+
+    def get(self, netid: str) -> MirroredPerson | None:
+        """Returns the person with the NetID, using the NetID index."""
+        row = self.connection.execute(
+            "SELECT Syscode, NetID, TradeRef, WorkingHoursTariffGroupRef, IsArchived, Modified FROM persons WHERE NetID = ?", (netid,)
+        ).fetchone()
+        return MirroredPerson(*row[:4], bool(row[4]), row[5]) if row else None
+
+    # WRITE
+
+    def set_crew(self, syscode: int, trade_ref: int | None, laborgroup_ref: int | None) -> None:
+        """Records an update applied to Planon, so the mirror is right before the next refresh."""
+        with self.connection:
+            self.connection.execute(
+                "UPDATE persons SET TradeRef = ?, WorkingHoursTariffGroupRef = ? WHERE Syscode = ?", (trade_ref, laborgroup_ref, syscode)
+            )
@@ -0,0 +1,133 @@
+import logging
+from typing import Any, Iterable
+
+# *********************************************************************
+# LOGGING - set of log messages
+# *********************************************************************
+
+log = logging.getLogger(__name__)
+
+# *********************************************************************
+# SETUP
+# *********************************************************************
+
+# filter -> query parameter of the iPaaS employees endpoint
+FILTER_PARAMS = {
+    "netids": "netid",
+    "has_maintenance_crew": "has_maintenance_crew",
+    "active_jobs": "job_current_status",
+    "changed_since": "updated_since",
+    "fields": "fields",
+}
+FILTERS = tuple(FILTER_PARAMS)
+
+# filters the endpoint is known to apply, the others are applied client-side
+# none by default: an iPaaS that rejects a parameter answers 400, which fails the run
+SUPPORTED_FILTERS: frozenset[str] = frozenset()
+
+# employee field with the time it was last changed in HRMS
+# employees without it, or with a value that isn't a timestamp string, are kept by a client-side changed_since
+CHANGED_FIELD = "last_updated"
+
+# *******************************************************************************
+# EmployeeQuery
+# Builds the query string of the employees endpoint, and applies what the
+# endpoint doesn't support to every page as it is decoded
+# *******************************************************************************
+
+class EmployeeQuery:
+    """Row filters and field selection for get_resources().
+
+    e.g. EmployeeQuery().has_maintenance_crew().netids(["f007dch"])
+
+    Args:
+        supported (Iterable[str]): filters pushed down to the endpoint, see FILTERS
+    """
+
+    def __init__(self, supported: Iterable[str] = SUPPORTED_FILTERS):
+        unknown = set(supported) - set(FILTERS)
+        if unknown:
+            raise ValueError(f"Unknown filters {sorted(unknown)}, expected some of {list(FILTERS)}")
+
+        self.supported = frozenset(supported)
+        self.filters: dict[str, Any] = {}
+
+    def __repr__(self) -> str:
+        return f"EmployeeQuery({self.filters}, supported={sorted(self.supported)})"
+
+    # BUILDER
+
+    def netids(self, netids: Iterable[str]) -> "EmployeeQuery":
+        self.filters["netids"] = frozenset(netids)
+        return self
+
+    def has_maintenance_crew(self) -> "EmployeeQuery":
+        self.filters["has_maintenance_crew"] = True
+        return self
+
+    def active_jobs(self) -> "EmployeeQuery":
+        self.filters["active_jobs"] = True
+        return self
+
+    def changed_since(self, timestamp: str) -> "EmployeeQuery":
+        self.filters["changed_since"] = timestamp
+        return self
+
+    def fields(self, *fields: str) -> "EmployeeQuery":
+        self.filters["fields"] = tuple(fields)
+        return self
+
+    # SERVER SIDE
+
+    def params(self) -> dict[str, str]:
+        """Returns the query parameters for the filters the endpoint supports."""
+        params = {}
+        for name, value in self.filters.items():
+            if name not in self.supported:
+                continue
+            if name == "netids":
+                value = ",".join(sorted(value))
+            elif name == "fields":
+                value = ",".join(value)
+            elif name == "active_jobs":
+                value = "Active"
+            elif value is True:
+                value = "true"
+            params[FILTER_PARAMS[name]] = value
+
+        return params
+
+    # CLIENT SIDE
+
+    def client_filters(self) -> list[str]:
+        return [name for name in self.filters if name not in self.supported]
+
+    def matches(self, employee: dict[str, Any]) -> bool:
+        """Applies the row filters the endpoint doesn't support to one employee."""
+        filters = self.filters
+        jobs = employee.get("jobs") or []
+
+        if "netids" in filters and "netids" not in self.supported and employee["netid"] not in filters["netids"]:
+            return False
+        if "has_maintenance_crew" in filters and "has_maintenance_crew" not in self.supported and not any(
+            (job.get("maintenance_crew") or {}).get("crew_code") is not None for job in jobs
+        ):
+            return False
+        if "active_jobs" in filters and "active_jobs" not in self.supported and not any(job.get("job_current_status") == "Active" for job in jobs):
+            return False
+        # an employee without the field can't be ruled out, it is kept
+        if "changed_since" in filters and "changed_since" not in self.supported:
+            changed = employee.get(CHANGED_FIELD)
+            if isinstance(changed, str) and changed < filters["changed_since"]:
+                return False
+
+        return True
+
+    def apply(self, employees: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """Filters and projects one decoded page."""
+        employees = [employee for employee in employees if self.matches(employee)]
+
+        if "fields" in self.filters and "fields" not in self.supported:
+            employees = [{field: employee[field] for field in self.filters["fields"] if field in employee} for employee in employees]
+
+        return employees
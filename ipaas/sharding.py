@@ -0,0 +1,215 @@
+import hashlib
+import json
+import logging
+import os
+from typing import Any
+
+# *********************************************************************
+# LOGGING - set of log messages
+# *********************************************************************
+
+log = logging.getLogger(__name__)
+
+# *********************************************************************
+# SETUP - exit codes shared by main.py and coordinator.py
+# *********************************************************************
+
+EXIT_OK = os.EX_OK
+EXIT_UNSTABLE = 57  # unstable build exit code, see main.get_exit_code()
+EXIT_WORKER_FAILED = 1  # a shard crashed or never wrote its results file
+EXIT_PARTIAL = os.EX_TEMPFAIL  # 75, stopped by --deadline or SIGTERM with writes left, rerun with --resume
+
+# *******************************************************************************
+# FUNCTIONS
+# parse_shard, shard_of, in_shard, write_results, read_results, missing_shards, merge_results
+# *******************************************************************************
+
+# *******************************************************************************
+# parse_shard - "i/N" from the command line into (index, count)
+# *******************************************************************************
+
+def parse_shard(spec: str) -> tuple[int, int]:
+    """Parses a shard spec such as "0/4" into an (index, count) tuple.
+
+    Args:
+        spec (str): shard spec in the form "i/N", with 0 <= i < N
+
+    Returns:
+        tuple[int, int]: shard index and shard count
+
+    Raises:
+        ValueError: If the spec is malformed or the index is out of range.
+    """
+    try:
+        index, count = (int(part) for part in spec.split("/"))
+    except ValueError:
+        raise ValueError(f"Expected a shard spec like '0/4', but got '{spec}'")
+
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Shard index must be between 0 and {count - 1}, but got '{spec}'")
+
+    return index, count
+
+# *******************************************************************************
+# shard_of - deterministic partition of a netid
+# hash() is salted per process, so use a stable digest instead
+# *******************************************************************************
+
+def shard_of(netid: str, count: int) -> int:
+    """Returns the shard a netid belongs to, the same on every process and node.
+
+    Args:
+        netid (str): netid of the employee / Planon person
+        count (int): total number of shards
+
+    Returns:
+        int: shard index between 0 and count - 1
+    """
+    digest = hashlib.blake2b(netid.lower().encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % count
+
+
+def in_shard(netid: str, shard: tuple[int, int] | None) -> bool:
+    """Returns True if the netid belongs to the shard, or if there is no sharding."""
+    if shard is None:
+        return True
+
+    index, count = shard
+    return shard_of(netid, count) == index
+
+# *******************************************************************************
+# write_results / read_results - per-shard result file, one JSON document
+# *******************************************************************************
+
+def write_results(
+    path: str,
+    shard: tuple[int, int] | None,
+    updated_netids: list[str],
+    skipped_netids: list[str],
+    failed_netids: list[dict[str, Any]],
+    exit_code: int,
+    stale_netids: list[str] | None = None,
+    cleared_netids: list[str] | None = None,
+    deferred_netids: list[str] | None = None,
+) -> None:
+    """Writes the results of one run (or one shard) so they can be merged later.
+
+    Exceptions are not JSON serializable, so failures keep the exception type
+    name and message; the type name is all get_exit_code() looks at.
+    """
+    results = {
+        "shard": f"{shard[0]}/{shard[1]}" if shard else None,
+        "updated": updated_netids,
+        "skipped": skipped_netids,
+        "stale": stale_netids or [],
+        "cleared": cleared_netids or [],
+        "deferred": deferred_netids or [],
+        "failed": [
+            {
+                "netid": failed["netid"],
+                "exception_type": type(failed["exception"]).__name__,
+                "exception": str(failed["exception"]),
+            }
+            for failed in failed_netids
+        ],
+        "exit_code": exit_code,
+    }
+
+    # write then rename, so a coordinator never reads a half written file
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(results, f, indent=2)
+    os.replace(tmp_path, path)
+
+    log.debug(f"Results written to {path}")
+
+
+def read_results(path: str) -> dict[str, Any]:
+    with open(path, "r") as f:
+        return json.load(f)
+
+# *******************************************************************************
+# missing_shards - every shard i of N exactly once, or the merge isn't the whole population
+# *******************************************************************************
+
+def missing_shards(shard_specs: list[str | None]) -> list[str]:
+    """Checks the "i/N" shard fields of the results to merge.
+
+    Args:
+        shard_specs (list): the "shard" field of every results file, None for an unsharded run
+
+    Returns:
+        list[str]: what is wrong, e.g. "shard 2/4 is missing", empty if every shard is there once
+    """
+    if shard_specs == [None]:
+        return []
+    if None in shard_specs:
+        return ["an unsharded run can't be merged with shards"]
+
+    try:
+        shards = [parse_shard(spec) for spec in shard_specs]
+    except ValueError as ex:
+        return [str(ex)]
+    counts = {count for index, count in shards}
+    if len(counts) > 1:
+        return [f"shards of different counts {sorted(counts)}"]
+
+    problems = []
+    count = counts.pop() if counts else 0
+    for index in range(count):
+        found = shards.count((index, count))
+        if found == 0:
+            problems.append(f"shard {index}/{count} is missing")
+        elif found > 1:
+            problems.append(f"shard {index}/{count} is there {found} times")
+
+    return problems
+
+# *******************************************************************************
+# merge_results - one report and one exit code out of N shards
+# *******************************************************************************
+
+def merge_results(shard_results: list[dict[str, Any] | None]) -> dict[str, Any]:
+    """Merges per-shard results into a single report.
+
+    Args:
+        shard_results (list): results as returned by read_results(), or None
+            for a shard that crashed before writing its results file
+
+    Returns:
+        dict: merged updated / skipped / stale / cleared / deferred / failed lists and the overall exit code.
+            A crashed, missing or duplicate shard wins over a partial one, which wins over an unstable one,
+            which wins over success.
+    """
+    merged: dict[str, Any] = {"shards": [], "updated": [], "skipped": [], "stale": [], "cleared": [], "deferred": [], "failed": [], "exit_code": EXIT_OK}
+    exit_codes = []
+
+    for results in shard_results:
+        if results is None:
+            exit_codes.append(EXIT_WORKER_FAILED)
+            continue
+
+        merged["shards"].append(results["shard"])
+        merged["updated"].extend(results["updated"])
+        merged["skipped"].extend(results["skipped"])
+        merged["stale"].extend(results.get("stale", []))
+        merged["cleared"].extend(results.get("cleared", []))
+        merged["deferred"].extend(results.get("deferred", []))
+        merged["failed"].extend(results["failed"])
+        exit_codes.append(results["exit_code"])
+
+    problems = missing_shards(merged["shards"]) if merged["shards"] else []
+    for problem in problems:
+        log.error(f"Incomplete merge: {problem}")
+    if problems:
+        exit_codes.append(EXIT_WORKER_FAILED)
+
+    crashed = [code for code in exit_codes if code not in (EXIT_OK, EXIT_UNSTABLE, EXIT_PARTIAL)]
+    if crashed:
+        merged["exit_code"] = crashed[0]
+    elif EXIT_PARTIAL in exit_codes:
+        merged["exit_code"] = EXIT_PARTIAL
+    elif EXIT_UNSTABLE in exit_codes:
+        merged["exit_code"] = EXIT_UNSTABLE
+
+    return merged
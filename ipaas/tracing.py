@@ -0,0 +1,184 @@
+import contextvars
+import json
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator
+from urllib.parse import parse_qsl, urlsplit
+
+import requests
+
+# *********************************************************************
+# LOGGING - set of log messages
+# *********************************************************************
+
+log = logging.getLogger(__name__)
+
+# *********************************************************************
+# SETUP
+# *********************************************************************
+
+# URL templates, so every employee page or Planon person is the same kind of call
+# the named groups become span args, e.g. GET /api/employees/{netid} with netid=f007dch
+URL_TEMPLATES = (
+    (re.compile(r"/Person/(?P<syscode>\d+)$"), "/Person/{syscode}"),
+    (re.compile(r"/employees/(?P<netid>[^/]+)$"), "/employees/{netid}"),
+)
+QUERY_ARGS = ("page", "pagesize", "scope")  # plus the keyset cursor parameter, when the run pages by one
+SLOW_CALL_THRESHOLD = 5.0  # seconds, slower calls are logged as they finish
+
+# *******************************************************************************
+# url_template
+# *******************************************************************************
+
+def url_template(url: str, query_args: tuple[str, ...] = QUERY_ARGS) -> tuple[str, dict[str, str]]:
+    """Returns the URL template of a request and the values taken out of it.
+
+    e.g. https://api.dartmouth.edu/api/employees?pagesize=1000&page=3
+    gives ("https://api.dartmouth.edu/api/employees?pagesize={pagesize}&page={page}", {"pagesize": "1000", "page": "3"})
+
+    Args:
+        url (str): URL of the request
+        query_args (tuple[str, ...]): query parameters whose values become span args
+    """
+    parts = urlsplit(url)
+    path, args = parts.path, {}
+
+    for pattern, template in URL_TEMPLATES:
+        match = pattern.search(path)
+        if match:
+            path = path[:match.start()] + template
+            args.update(match.groupdict())
+            break
+
+    query = parse_qsl(parts.query)
+    args.update((name, value) for name, value in query if name in query_args)
+
+    template = f"{parts.scheme}://{parts.netloc}{path}"
+    if query:
+        template += "?" + "&".join(f"{name}={{{name}}}" for name, value in query)
+
+    return template, args
+
+# *******************************************************************************
+# Tracer
+# Spans are Chrome Trace Event "X" (complete) events, the trace file opens in
+# chrome://tracing or https://ui.perfetto.dev
+# Spans nest by time on their thread, so an HTTP span sits under the phase it ran in
+# tagged() adds args such as the netid of a write to every span started in it, the HTTP ones included
+# Both the thread and the tags are context variables, so code run in a copy of the
+# context on another thread (a hedged attempt) traces as if it ran in the caller
+# *******************************************************************************
+
+class Tracer:
+    """Records a span for every outbound HTTP request and for every phase of a run.
+
+    Args:
+        path (str): trace file written by write(), None to only log slow calls
+        slow_threshold (float): seconds after which a call is logged as slow, None to never log
+        cursor_param (str): keyset pagination query parameter, e.g. netid_gt, recorded like page
+    """
+
+    def __init__(self, path: str | None = None, slow_threshold: float | None = None, cursor_param: str | None = None):
+        self.path = path
+        self.slow_threshold = slow_threshold
+        self.query_args = QUERY_ARGS + ((cursor_param,) if cursor_param else ())
+        self.events: list[dict[str, Any]] = []
+        self.phases: list[str] = []
+
+        self._lock = threading.Lock()
+        self._tid: contextvars.ContextVar[int | None] = contextvars.ContextVar(f"tracer_tid_{id(self)}", default=None)
+        self._tags: contextvars.ContextVar[dict[str, Any]] = contextvars.ContextVar(f"tracer_tags_{id(self)}", default={})
+        self._pid = os.getpid()
+
+    def _add(self, name: str, cat: str, start: int, end: int, args: dict[str, Any]) -> None:
+        if self.path is None:
+            return
+        event = {"name": name, "cat": cat, "ph": "X", "ts": start // 1000, "dur": (end - start) // 1000, "pid": self._pid, "tid": self._tid.get() or threading.get_ident(), "args": args}
+        with self._lock:
+            self.events.append(event)
+
+    def _check_slow(self, name: str, duration: float, args: dict[str, Any]) -> None:
+        if self.slow_threshold is not None and duration > self.slow_threshold:
+            log.warning(f"Slow call {name} took {duration:.3f}s {args}")
+
+    @contextmanager
+    def span(self, name: str, cat: str = "call", **args: Any) -> Iterator[dict[str, Any]]:
+        """Times the block as a span, e.g. with tracer.span("Person.find"): ...
+
+        Yields the span args, so the block can add to them.
+        """
+        if cat == "phase":
+            self.phases.append(name)
+        elif self.phases:
+            args["phase"] = self.phases[-1]
+        for tag, value in self._tags.get().items():
+            args.setdefault(tag, value)
+
+        # the outermost span picks the thread, spans started in a copy of its context stay on it
+        tid_token = self._tid.set(self._tid.get() or threading.get_ident())
+        start = time.perf_counter_ns()
+        try:
+            yield args
+        finally:
+            end = time.perf_counter_ns()
+            self._tid.reset(tid_token)
+            if cat == "phase":
+                self.phases.pop()
+            else:
+                self._check_slow(name, (end - start) / 1e9, args)
+            self._add(name, cat, start, end, args)
+
+    @contextmanager
+    def tagged(self, **tags: Any) -> Iterator[None]:
+        """Adds the tags to the args of every span started in the block, and in copies of its context,
+        e.g. with tracer.tagged(netid="f007dch"): utils.update_person_crew(...)
+        """
+        token = self._tags.set({**self._tags.get(), **tags})
+        try:
+            yield
+        finally:
+            self._tags.reset(token)
+
+    def instrument(self, session: requests.Session) -> requests.Session:
+        """Traces every request sent by the session, and returns it."""
+        send = session.send
+
+        def traced_send(request: requests.PreparedRequest, **kwargs: Any) -> requests.Response:
+            template, args = url_template(request.url, self.query_args)
+            with self.span(f"{request.method} {template}", cat="http", method=request.method, url=template, **args) as span_args:
+                try:
+                    response = send(request, **kwargs)
+                except Exception as ex:
+                    span_args["error"] = type(ex).__name__
+                    raise
+
+                # urllib3 keeps the retries it made on the raw response
+                retries = getattr(response.raw, "retries", None)
+                span_args["status"] = response.status_code
+                span_args["retries"] = len(retries.history) if retries else 0
+                # a streamed body is never read, so fall back on what the server announced
+                span_args["bytes"] = int(response.headers.get("Content-Length", 0)) if kwargs.get("stream") else len(response.content)
+                return response
+
+        session.send = traced_send
+        return session
+
+    def write(self) -> None:
+        """Writes the trace file in the Chrome Trace Event JSON format."""
+        if self.path is None:
+            return
+
+        with self._lock:
+            trace = {"traceEvents": list(self.events), "displayTimeUnit": "ms"}
+
+        # write then rename, so a viewer never opens a half written file
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(trace, f)
+        os.replace(tmp_path, self.path)
+
+        log.info(f"Trace with {len(trace['traceEvents'])} spans written to {self.path}")
@@ -1,12 +1,18 @@
 import logging
-from typing import Any
+import time
+from typing import Any, Callable
 import json
+from urllib.parse import urlencode
 
 import requests
 from requests.adapters import HTTPAdapter, Retry
 
 import planon
 
+from ipaas.hedging import HedgePolicy
+from ipaas.query import EmployeeQuery
+from ipaas.paging import PAGE_SIZE, Pager
+
 # *********************************************************************
 # LOGGING - set of log messages
 # *********************************************************************
@@ -18,7 +24,6 @@ log = logging.getLogger(__name__)
 # retry session , if error
 # *********************************************************************
 
-PAGE_SIZE = 1000
 RETRIES = 3
 
 session = requests.Session()
@@ -30,11 +35,36 @@ BACK_OFF_FACTOR = 1
 TIME_BETWEEN_RETRIES = 1000
 ERROR_CODES = (400, 401, 405, 500, 502, 503)
 
+# Planon person resource, the same one planon.Person.save() writes to
+PLANON_PERSON_URL = "{url}/Person/{syscode}"
+
 ### Retry mechanism for server error ### https://stackoverflow.com/questions/23267409/how-to-implement-retry-mechanism-into-python-requests-library###
 # {backoff factor} * (2 ** ({number of total retries} - 1))
 retry_strategy = Retry(total=25, backoff_factor=1, status_forcelist=ERROR_CODES)
 session.mount("https://", HTTPAdapter(max_retries=retry_strategy))
 
+# Partial updates set absolute values, so a PATCH is safe to send again, but only on
+# server errors and a few times: a rejected write fails its netid instead of stalling the run
+WRITE_ERROR_CODES = (500, 502, 503)
+write_retry_strategy = retry_strategy.new(
+    total=RETRIES,
+    status_forcelist=WRITE_ERROR_CODES,
+    allowed_methods=Retry.DEFAULT_ALLOWED_METHODS | {"PATCH"},
+    raise_on_status=False,
+)
+
+
+def write_session() -> requests.Session:
+    """Returns a new session for update_person_crew(), retrying like `session` does for reads.
+
+    Mounted on http:// too, PLANON_API_URL can point at a local stand-in server.
+    """
+    write_session = requests.Session()
+    adapter = HTTPAdapter(max_retries=write_retry_strategy)
+    write_session.mount("https://", adapter)
+    write_session.mount("http://", adapter)
+    return write_session
+
 # ********************************************************************
 # SOURCE EXCLUDED CREW CODES
 # ********************************************************************
@@ -95,7 +125,13 @@ def get_jwt(
     
 # Get_resources: access all resources
 def get_resources(
-    jwt: str, url: str, session: requests.Session = session
+    jwt: str,
+    url: str,
+    session: requests.Session = session,
+    decode: Callable[[bytes], list[dict[str, Any]]] | None = None,
+    hedge: HedgePolicy | None = None,
+    query: EmployeeQuery | None = None,
+    pager: Pager | None = None,
 ) -> list[dict[str, Any]]:
     """Feeds in URL and get response of respurces as objects"""
     """Returns all the resources from dart_api
@@ -103,6 +139,12 @@ def get_resources(
         jwt (str): JWT token from .env file
         url (str): URL of the API (e.g., https://api.dartmouth.edu/employees)
         session (requests.Session): Optional session for making requests
+        decode (Callable): Optional decoder from the page bytes, e.g. decoding.decode_employees,
+            instead of the generic response.json()
+        hedge (HedgePolicy): Optional hedging of slow pages, a duplicate GET is fired past the latency threshold
+        query (EmployeeQuery): Optional row filters and field selection, pushed down as query parameters when
+            the endpoint supports them, otherwise applied to every page as it is decoded
+        pager (Pager): Optional adaptive page size and keyset continuation, fixed pages of PAGE_SIZE by default
     Returns:
         List[Dict]: List of resources records
     """
@@ -110,32 +152,118 @@ def get_resources(
         "Authorization": "Bearer " + jwt,
         "Content-Type": "application/json",
     }
-    page_number: int = 1
+    pager = pager or Pager(PAGE_SIZE)
     resources = []
-
-    while True:
-        resources_url = f"{url}?pagesize={PAGE_SIZE}&page={page_number}" # url
-        response = session.get(url=resources_url, headers=headers) # get method
+    query_string = f"&{urlencode(query.params())}" if query and query.params() else ""
+    if query:
+        log.debug(f"Query {query}, applied client-side: {query.client_filters()}")
+
+    while not pager.done:
+        resources_url = f"{url}?{urlencode(pager.params())}{query_string}" # url
+        start = time.perf_counter()
+        if hedge:
+            # pages are idempotent GETs, the slower of a hedged pair is closed unread
+            response = hedge.run(lambda resources_url=resources_url: session.get(url=resources_url, headers=headers), key=f"GET {url}", cleanup=lambda response: response.close())
+        else:
+            response = session.get(url=resources_url, headers=headers) # get method
         response.raise_for_status()  #raise http error      
 
-        # Convert the response content to JSON format
-        response_json = response.json()
+        # Convert the response content to JSON format, typed and slim when a decoder is given
+        response_json = decode(response.content) if decode else response.json()
 
-        # used to append the data from the response to the resources list
-        resources.extend(response_json)    
+        # the pager drops records already returned by an earlier page, and knows if this was the last page:
+        # a short page, or the total count header reached
+        response_json = pager.next_page(response_json, seconds=time.perf_counter() - start, size=len(response.content), headers=response.headers)
+
+        # used to append the data from the response to the resources list, only what the query keeps
+        resources.extend(query.apply(response_json) if query else response_json)
 
         log.debug(f"Records returned, so far: {len(resources)}")
 
-        # response will always be equal PAGE_SIZE(1000), unless it is last page
-        if len(response_json) < PAGE_SIZE:
-            break  # Exit the loop since it's the last page
-        
-        page_number += 1
+    if pager.duplicates:
+        log.warning(f"{pager.duplicates} duplicate records dropped while paging {url}")
 
     dart_resources = {dc_resource["netid"]: dc_resource for dc_resource in resources}  # dictionary of Dartmouth resources with netid as the key
     log.info(f"Total number of dart_resources: {len(dart_resources)}")
     return resources
 
+# *******************************************************************************
+# get_resource
+# Single resource by url, e.g. one employee from {DARTMOUTH_API_URL}/api/employees/{netid}
+# Returns None if the resource doesn't exist
+# *******************************************************************************
+
+def get_resource(
+    jwt: str,
+    url: str,
+    session: requests.Session = session,
+    decode: Callable[[bytes], dict[str, Any]] | None = None,
+) -> dict[str, Any] | None:
+    """Returns a single resource from dart_api
+    Args:
+        jwt (str): JWT token from get_jwt()
+        url (str): URL of the resource (e.g., https://api.dartmouth.edu/api/employees/f007dch)
+        session (requests.Session): Optional session for making requests
+        decode (Callable): Optional decoder from the response bytes, e.g. decoding.decode_employee
+    Returns:
+        Dict: the resource record, or None if it was not found
+    """
+    headers: dict = {
+        "Authorization": "Bearer " + jwt,
+        "Content-Type": "application/json",
+    }
+
+    response = session.get(url=url, headers=headers)
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+
+    return decode(response.content) if decode else response.json()
+
+# *******************************************************************************
+# update_person_crew
+# Partial update of a Planon person: sends only TradeRef and WorkingHoursTariffGroupRef
+# instead of round-tripping the whole Person like planon.Person.save()
+# The response body is never read, so the updated Person is not deserialized
+# *******************************************************************************
+
+def update_person_crew(
+    url: str,
+    jwt: str,
+    syscode: int,
+    trade_ref: int | None,
+    laborgroup_ref: int | None,
+    session: requests.Session = session,
+) -> None:
+    """Updates only the trade and labor group of a Planon person
+
+    Args:
+        url (str): PLANON_API_URL
+        jwt (str): PLANON_API_KEY
+        syscode (int): Syscode of the Planon person
+        trade_ref (int | None): Syscode of the trade, None to clear it
+        laborgroup_ref (int | None): Syscode of the labor group, None to clear it
+        session (requests.Session): Optional session for making requests
+
+    Raises:
+        requests.HTTPError: If Planon rejects the update
+    """
+    headers: dict = {
+        "Authorization": "Bearer " + jwt,
+        "Content-Type": "application/json",
+    }
+    fields = {
+        "TradeRef": trade_ref,
+        "WorkingHoursTariffGroupRef": laborgroup_ref,
+    }
+
+    # stream=True so the response body is never downloaded, only the status is checked
+    response = session.patch(url=PLANON_PERSON_URL.format(url=url, syscode=syscode), headers=headers, json=fields, stream=True)
+    try:
+        response.raise_for_status()
+    finally:
+        response.close()
+
 # *******************************************************************************
 # get_active_facilities_crew_code
 # Extracts the active crew code from the given employee data
@@ -252,3 +380,115 @@ def compare_crewcodes(
     return ipaas_trade, ipaas_laborgroup, pln_trade_code, pln_laborgroup_code
 
 
+
+
+# *******************************************************************************
+# get_crew_update
+# Compares the crew codes on both sides like main() does for every employee
+# Returns whether the person needs an update, and the trade & labor group syscodes to write
+# *******************************************************************************
+
+def get_crew_update(
+    active_crew_code: str,
+    pln_person: planon.Person,
+    pln_trades_by_syscodes: dict[int, planon.Trade],
+    pln_trades_by_codes: dict[str, planon.Trade],
+    pln_laborgroups_by_syscodes: dict[int, planon.WorkingHoursTariffGroup],
+    pln_laborgroups_by_codes: dict[str, planon.WorkingHoursTariffGroup],
+    excluded_crew_codes: list[str],
+) -> tuple[bool, int | None, int | None]:
+    """
+    Determine whether a person's trade and labor group need an update.
+
+    Args:
+        active_crew_code (str): The active crew code for the person, from get_active_facilities_crew_code().
+        pln_person (planon.Person): The Planon person object, or anything with TradeRef and WorkingHoursTariffGroupRef.
+        pln_trades_by_syscodes (dict[int, planon.Trade]): Planon trades by syscode.
+        pln_trades_by_codes (dict[str, planon.Trade]): Planon trades by code.
+        pln_laborgroups_by_syscodes (dict[int, planon.WorkingHoursTariffGroup]): Planon labor groups by syscode.
+        pln_laborgroups_by_codes (dict[str, planon.WorkingHoursTariffGroup]): Planon labor groups by code.
+        excluded_crew_codes (list[str]): A list of crew codes to be excluded from comparison.
+
+    Returns:
+        tuple: A tuple containing the following information:
+            - needs_update (bool): True if Planon doesn't match iPaaS.
+            - trade_ref (int | None): The trade syscode to write, None to clear it.
+            - laborgroup_ref (int | None): The labor group syscode to write, None to clear it.
+
+    Raises:
+        KeyError: If the active crew code has no Planon trade or labor group.
+    """
+
+    # compare crew codes on both sides 
+    # ipaas side accounts for excluded crew codes such as ML, CEOPS
+    # planon side accounts for getting syscode for trades and labor groups and then converts it into code equivalent - 53 converts to BAS for lg, 117 converts to BAS for trade
+    ipaas_trade, ipaas_labor_group, pln_trade_code, pln_laborgroup_code = compare_crewcodes(active_crew_code, pln_person, pln_trades_by_syscodes, pln_laborgroups_by_syscodes, excluded_crew_codes)
+
+    # return '' for crewcodes that retun None,so it is in similar format on both sides
+    ipaas_trade = '' if ipaas_trade is None else ipaas_trade
+    ipaas_labor_group = '' if ipaas_labor_group is None else ipaas_labor_group
+
+    # compare code to similar to IPaas format
+    person_ipaas = {
+        "trade": ipaas_trade,
+        "labor_group": ipaas_labor_group
+    }
+
+    person_pln = {
+        "trade": pln_trade_code if pln_trade_code else "",
+        "labor_group": pln_laborgroup_code if pln_laborgroup_code else ""
+    }
+
+    # after comparing , convert it back to trade& labor group list , so we can access syscode 
+    # syscode is stored in Planon side, not code
+    pln_trade = pln_trades_by_codes[active_crew_code] if active_crew_code else ""
+    pln_laborgroup = pln_laborgroups_by_codes[active_crew_code] if active_crew_code else ""
+
+    trade_ref = pln_trade.Syscode if pln_trade else None
+    laborgroup_ref = pln_laborgroup.Syscode if pln_laborgroup else None
+
+    return person_ipaas != person_pln, trade_ref, laborgroup_ref
+
+
+# *******************************************************************************
+# get_stale_crew_netids
+# Reverse reconciliation: Planon persons that still carry a crew iPaaS no longer gives them
+# Set differences between the two netid indexes, no extra fetches
+# *******************************************************************************
+
+def get_stale_crew_netids(
+    pln_persons: dict[str, planon.Person],
+    dart_employees: dict[str, dict[str, Any]],
+) -> set[str]:
+    """
+    Find the Planon persons whose trade or labor group is stale.
+
+    The Planon index is every non-archived person with a TradeRef or a
+    WorkingHoursTariffGroupRef. The iPaaS index is every employee with an active
+    facilities crew code, or with conflicting ones, which the forward pass reports.
+    What is left of the Planon index is persons who left the feed, and persons who
+    are still in the feed but lost their crew.
+
+    Args:
+        pln_persons (dict[str, planon.Person]): Planon persons by netid, as returned by get_planon_data().
+        dart_employees (dict[str, dict]): iPaaS employees by netid.
+
+    Returns:
+        set[str]: netids of the Planon persons whose trade and labor group should be cleared.
+    """
+
+    pln_netids = {
+        netid for netid, pln_person in pln_persons.items()
+        if (pln_person.TradeRef is not None or pln_person.WorkingHoursTariffGroupRef is not None)
+        and not getattr(pln_person, "IsArchived", False)
+    }
+
+    dart_netids = set()
+    for netid, employee in dart_employees.items():
+        try:
+            if get_active_facilities_crew_code(employee):
+                dart_netids.add(netid)
+        except ValueError:
+            dart_netids.add(netid)  # multiple active crews, not ours to clear
+
+    return pln_netids - dart_netids
@@ -3,6 +3,8 @@ import sys
 import time
 import logging
 import json
+import argparse
+import signal
 
 import requests
 
@@ -10,6 +12,15 @@ import planon
 from planon import Person
 
 from ipaas import utils
+from ipaas import sharding
+from ipaas import checkpoint
+from ipaas import decoding
+from ipaas import planon_mirror
+from ipaas import hedging
+from ipaas import tracing
+from ipaas import query
+from ipaas import deadline
+from ipaas import paging
 
 # *********************************************************************
 # LOGGING
@@ -52,16 +63,69 @@ def setup():
     
     return PLANON_API_URL, PLANON_API_KEY, DARTMOUTH_API_URL, DARTMOUTH_API_KEY, headers, scopes
 
+STALE_BATCH_SIZE = 100  # stale crews cleared per run, the next runs clear the rest
+DEFAULT_NETIDS = None  # netids a run without --netid is limited to, None for the whole population
+MAX_STALE_FRACTION = 0.1  # of the Planon persons with a crew, more stale crews than that looks like a broken fetch
+
+# ***********************************************************************
+# ARGUMENTS
+# --shard i/N runs only the netids that hash into shard i of N
+# --results-file writes updated/skipped/failed for coordinator.py to merge
+# --resume reuses fresh persisted fetches and skips netids already in the checkpoint journal
+# --full-save writes with planon.Person.save() instead of the partial trade & labor group update
+# --mirror reads Planon persons from a local SQLite mirror, refreshed with persons modified since the last run
+# --hedge fires a duplicate of slow iPaaS pages and Planon reads and takes the first response
+# --trace-file writes a span for every outbound request, nested under the run phases, in the Chrome Trace Event format
+# --netid runs only these netids, DEFAULT_NETIDS without it; --pushdown lists the employee filters the iPaaS endpoint applies itself
+# --adaptive-pages tunes the iPaaS page size from each page's time and bytes, --page-cursor pages by netid instead of page number
+# --deadline stops the run cleanly after this many seconds (or on SIGTERM), applying new crews before clears, exit code 75
+# --clear-stale clears up to --stale-batch-size Planon crews iPaaS no longer gives, unless more than --max-stale-fraction of them
+# look stale; without it they are only reported
+# ***********************************************************************
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Feed crew codes from iPaaS to Planon trades and labor groups")
+    parser.add_argument("--shard", type=sharding.parse_shard, default=None, metavar="i/N", help="only process netids in shard i of N")
+    parser.add_argument("--results-file", default=None, help="write the run results as JSON to this file")
+    parser.add_argument("--resume", action="store_true", help="resume the previous run from its checkpoint journal")
+    parser.add_argument("--checkpoint-dir", default="checkpoints", help="directory for the checkpoint journal and persisted fetches")
+    parser.add_argument("--max-snapshot-age", type=float, default=checkpoint.MAX_SNAPSHOT_AGE, help="seconds a persisted fetch can be reused by --resume")
+    parser.add_argument("--full-save", action="store_true", help="save the whole Person instead of only TradeRef and WorkingHoursTariffGroupRef")
+    parser.add_argument("--mirror", default=None, metavar="PATH", help="SQLite mirror of Planon persons to compare against")
+    parser.add_argument("--full-resync-interval", type=float, default=planon_mirror.FULL_RESYNC_INTERVAL, help="seconds between full resyncs of the mirror")
+    parser.add_argument("--hedge", action="store_true", help="hedge slow iPaaS pages and Planon reads with a duplicate request")
+    parser.add_argument("--hedge-delay", type=float, default=hedging.INITIAL_DELAY, help="seconds before hedging a kind of request with no latency history yet")
+    parser.add_argument("--netid", action="append", default=None, help="only process this netid, can be repeated")
+    parser.add_argument("--pushdown", action="append", default=[], choices=query.FILTERS, help="employee filter the iPaaS endpoint supports, can be repeated")
+    parser.add_argument("--trace-file", default=None, metavar="PATH", help="write a Chrome Trace Event JSON file of every outbound request")
+    parser.add_argument("--slow-call-threshold", type=float, default=tracing.SLOW_CALL_THRESHOLD, help="log calls slower than this many seconds")
+    parser.add_argument("--adaptive-pages", action="store_true", help="tune the iPaaS page size from the response time and bytes of each page")
+    parser.add_argument("--page-cursor", default=None, metavar="PARAM", help="query parameter for keyset pagination by netid, e.g. netid_gt, if the iPaaS endpoint supports it")
+    parser.add_argument("--deadline", type=float, default=None, metavar="SECONDS", help="stop the run after this many seconds and exit with 75 if writes are left")
+    parser.add_argument("--clear-stale", action="store_true", help="clear the trade and labor group of Planon persons iPaaS no longer gives a crew")
+    parser.add_argument("--stale-batch-size", type=int, default=STALE_BATCH_SIZE, help="most stale crews cleared by one run, the next runs clear the rest")
+    parser.add_argument("--max-stale-fraction", type=float, default=MAX_STALE_FRACTION, help="refuse to clear stale crews when more than this fraction of the Planon persons with a crew are stale")
+
+    args = parser.parse_args(argv)
+    if args.netid is None and DEFAULT_NETIDS:
+        args.netid = list(DEFAULT_NETIDS)
+    if args.mirror and args.full_save:
+        parser.error("--full-save needs planon.Person objects, it can't be used with --mirror")
+
+    return args
+
 # ***********************************************************************
 # SOURCE DARTMOUTH DATA - employees
 # ***********************************************************************
 
-def get_dart_employees(DARTMOUTH_API_URL, DARTMOUTH_API_KEY, scopes):
+def get_dart_employees(DARTMOUTH_API_URL, DARTMOUTH_API_KEY, scopes, shard=None, hedge=None, tracer=None, employee_query=None, run_deadline=None, pager=None):
+    tracer = tracer or tracing.Tracer()
+    run_deadline = run_deadline or deadline.Deadline()
 
-    dart_jwt = utils.get_jwt(url=f"{DARTMOUTH_API_URL}/api/jwt", key=DARTMOUTH_API_KEY, scopes=scopes, session=requests.Session())
+    dart_jwt = utils.get_jwt(url=f"{DARTMOUTH_API_URL}/api/jwt", key=DARTMOUTH_API_KEY, scopes=scopes, session=tracer.instrument(run_deadline.bind(requests.Session())))
 
     log.info("Getting Dart employees with iPass from HRMS")
-    dart_employees = {dc_emp["netid"]: dc_emp for dc_emp in utils.get_resources(jwt=dart_jwt, url=f"{DARTMOUTH_API_URL}/api/employees", session=requests.Session())}
+    dart_employees = {dc_emp["netid"]: dc_emp for dc_emp in utils.get_resources(jwt=dart_jwt, url=f"{DARTMOUTH_API_URL}/api/employees", session=tracer.instrument(run_deadline.bind(requests.Session())), decode=decoding.decode_employees, hedge=hedge, query=employee_query, pager=pager) if sharding.in_shard(dc_emp["netid"], shard)}
     log.info(f"Total number of dart_employees: {len(dart_employees)}")
 
     return dart_employees
@@ -79,11 +143,23 @@ def load_excluded_crew_codes():
 # ********************************************************************************************************
 # SOURCE PLANON DATA - trades & labor groups by codes and syscodes, persons
 # ********************************************************************************************************
-# get_planon_data() doesn't require any parameters because it directly accesses the planon module objects. 
-def get_planon_data():
+# get_planon_data() only takes the shard, mirror, hedge, tracer and deadline, because it directly accesses the planon module objects. 
+def get_planon_data(shard=None, mirror=None, hedge=None, tracer=None, run_deadline=None):
+    tracer = tracer or tracing.Tracer()
+    run_deadline = run_deadline or deadline.Deadline()
+
+    # find() is an idempotent read, so it can be hedged
+    # the planon module sends its own requests, so find() is traced as one call and can only be stopped before it starts
+    def find(resource, *args):
+        run_deadline.check()
+        with tracer.span(f"{resource.__name__}.find", cat="planon", filter=args[0] if args else None):
+            if hedge:
+                return hedge.run(lambda: resource.find(*args), key=f"{resource.__name__}.find")
+            return resource.find(*args)
+
     # TRADES
     log.info("Getting Planon trades")
-    pln_trades = planon.Trade.find()
+    pln_trades = find(planon.Trade)
 
     pln_trades_by_syscodes = {trade.Syscode: trade for trade in pln_trades}
     log.debug(f"{pln_trades_by_syscodes.keys()=}")
@@ -96,7 +172,7 @@ def get_planon_data():
     # LABOR_GROUPS
     # TODO Update Planon configuration to require the Code field
     log.info("Getting Planon labor rates")
-    pln_laborgroups = planon.WorkingHoursTariffGroup.find()
+    pln_laborgroups = find(planon.WorkingHoursTariffGroup)
 
     pln_laborgroups_by_syscodes = {laborgroup.Syscode: laborgroup for laborgroup in pln_laborgroups if laborgroup.Code}
     log.debug(f"pln_laborgroup{pln_laborgroups_by_syscodes.keys()=}")
@@ -107,8 +183,14 @@ def get_planon_data():
     log.info(f"Total number of Planon labor groups: {len(pln_laborgroups)}")
 
     # PERSONS
-    log.info("Getting Planon persons")
-    pln_persons: dict[str, Person] = {pln_person.NetID: pln_person for pln_person in planon.Person.find() if pln_person.NetID is not None}
+    # Planon can't filter on a hash of the NetID, so the shard is applied to what find() returns
+    if mirror:
+        log.info("Refreshing the Planon persons mirror")
+        mirror.refresh(lambda *args: find(planon.Person, *args))
+        pln_persons = {netid: pln_person for netid, pln_person in mirror.persons().items() if sharding.in_shard(netid, shard)}
+    else:
+        log.info("Getting Planon persons")
+        pln_persons: dict[str, Person] = {pln_person.NetID: pln_person for pln_person in find(planon.Person) if pln_person.NetID is not None and not pln_person.IsArchived and sharding.in_shard(pln_person.NetID, shard)}
     for pln_person in pln_persons.values():
         assert pln_person.NetID is not None, f"NetID is None for {pln_person}"
 
@@ -124,99 +206,190 @@ def get_planon_data():
 # UPDATES  for trade and labor group that has changes for personnel records
 # ****************************************************************************************************************
 
-def main():
-    PLANON_API_URL, PLANON_API_KEY, DARTMOUTH_API_URL, DARTMOUTH_API_KEY, headers, scopes = setup()
-    
-    dart_employees = get_dart_employees(DARTMOUTH_API_URL, DARTMOUTH_API_KEY, scopes)
-    excluded_crew_codes = load_excluded_crew_codes()
-    pln_trades_by_syscodes, pln_trades_by_codes, pln_laborgroups_by_syscodes, pln_laborgroups_by_codes, pln_persons = get_planon_data()
-
-    dart_employees_inserts = {
-        dc_emp["netid"]: dc_emp for dc_emp in utils.get_resources(jwt=DARTMOUTH_API_KEY, url=f"{DARTMOUTH_API_URL}/api/employees", session=requests.Session()) if dc_emp["netid"] == "f007dch"
-    }
-    log.info(f"Total number of dart_employees: {len(dart_employees_inserts)}")
-
-    pln_filter_inserts = {
-        "filter": {
-            # "EmploymenttypeRef": {"eq": "8"},  # Personnel>Employment types> 5 = Staff   #Supervisior:Internal Coordinator-'12';Internal
-            # "FreeString7": {"exists": True}, # NetID, this ensures we only get Person records that have a NetID
-            "FreeString7": {"eq": "f007dch"},  # d28941t d1150d8 #f003cg4 #d10918g #f003841
-            # "FreeString2": {"eq": "Active"},  # dartmouth account status
-            "IsArchived": {"eq": False},
-            # "FreeInteger2": {'exists':False}, # Trade
-            # "WorkingHoursTariffGroupRef": {"exists": False},
-            # "FirstName":{"eq": "Jason"} #remove
-        }
-    }
-    pln_persons_inserts = {pln_emp.NetID: pln_emp for pln_emp in planon.Person.find(pln_filter_inserts)}
-    log.info(f"Total number of planon_employees for INSERTS : {str(len(pln_persons_inserts))}")
+def main(argv=None):
+    args = parse_args(argv)
+    shard = args.shard
+    if shard:
+        log.info(f"Running shard {shard[0]} of {shard[1]}")
 
+    PLANON_API_URL, PLANON_API_KEY, DARTMOUTH_API_URL, DARTMOUTH_API_KEY, headers, scopes = setup()
 
+    # each shard keeps its own journal, so shards can resume independently
+    checkpoint_dir = os.path.join(args.checkpoint_dir, f"shard-{shard[0]}-of-{shard[1]}") if shard else args.checkpoint_dir
+    run_checkpoint = checkpoint.Checkpoint(checkpoint_dir, max_snapshot_age=args.max_snapshot_age)
+    if not args.resume:
+        run_checkpoint.reset()
+    applied_netids = run_checkpoint.applied()
+    log.info(f"Total number of netids already applied in the checkpoint journal: {len(applied_netids)}")
+    
+    hedge = hedging.HedgePolicy(initial_delay=args.hedge_delay) if args.hedge else None
+    tracer = tracing.Tracer(args.trace_file, slow_threshold=args.slow_call_threshold, cursor_param=args.page_cursor)
 
-    log.info("Starting trade and labor group feed to Planon for UPDATES")
+    # the trace is written however the run ends, a crashed run is the one worth looking at
+    try:
+        # one budget for every HTTP call and the apply loop, SIGTERM stops the run at the next check
+        run_deadline = deadline.Deadline(args.deadline)
+        previous_sigterm_handler = signal.signal(signal.SIGTERM, lambda signum, frame: run_deadline.stop("SIGTERM"))
 
-    updated_netids = []
-    skipped_netids = []
-    failed_netids = []
+        # client-side the crew filter would drop employees who lost their crew before the compare clears their Planon crew,
+        # so it is only used when the endpoint applies it, see query.py; the stale pass catches what it leaves out
+        employee_query = query.EmployeeQuery(args.pushdown)
+        if "has_maintenance_crew" in args.pushdown:
+            employee_query.has_maintenance_crew()
+        if args.netid:
+            employee_query.netids(args.netid)
 
-    for dart_employee in dart_employees_inserts.values():
-        log.debug(f"Processing {dart_employee['netid']}")
+        pager = paging.Pager(adaptive=args.adaptive_pages, cursor_param=args.page_cursor)
 
         try:
-            pln_person = pln_persons_inserts[dart_employee["netid"]]
-
-            active_crew_code = utils.get_active_facilities_crew_code(dart_employee)
-
-            # compare crew codes on both sides 
-            # ipaas side accounts for excluded crew codes such as ML, CEOPS
-            # planon side accounts for getting syscode for trades and labor groups and then converts it into code equivalent - 53 converts to BAS for lg, 117 converts to BAS for trade
-            ipaas_trade, ipaas_labor_group, pln_trade_code, pln_laborgroup_code = utils.compare_crewcodes(active_crew_code, pln_person, pln_trades_by_syscodes, pln_laborgroups_by_syscodes,excluded_crew_codes)
-            
-            # return '' for crewcodes that retun None,so it is in similar format on both sides
-            ipaas_trade = '' if ipaas_trade is None else ipaas_trade
-            ipaas_labor_group = '' if ipaas_labor_group is None else ipaas_labor_group
-
-            # compare code to similar to IPaas format
-            person_ipaas = {
-                "trade": ipaas_trade,
-                "labor_group": ipaas_labor_group
-            }
-
-            person_pln = {
-                "trade": pln_trade_code if pln_trade_code  else "",
-                "labor_group": pln_laborgroup_code if pln_laborgroup_code else ""
-            }
-
-            # after comparing , convert it back to trade& labor group list , so we can access syscode 
-            # syscode is stored in Planon side, not code
-            pln_trade = pln_trades_by_codes[active_crew_code] if active_crew_code else ""
-            pln_laborgroup = pln_laborgroups_by_codes[active_crew_code] if active_crew_code else ""
-
-            # UPDATES to trade and labor group:
-            if person_ipaas != person_pln:
-                log.info(f"Syncing {pln_person.NetID}")
-                pln_person.WorkingHoursTariffGroupRef = pln_laborgroup.Syscode if pln_laborgroup else None
-                pln_person.TradeRef = pln_trade.Syscode if pln_trade else None
-
-                pln_person = pln_person.save()
-                updated_netids.append(pln_person.NetID)
-                
-                log.info(f"Record {pln_person.NetID} updated with {active_crew_code}")
+            with tracer.span("dart_employees", cat="phase"):
+                # a snapshot of other netids, filters or shard would make the rest of Planon look stale
+                fetch_params = {"netids": sorted(args.netid or []), "pushdown": sorted(args.pushdown), "shard": list(shard) if shard else None}
+                dart_employees = run_checkpoint.fetch("dart_employees", lambda: get_dart_employees(DARTMOUTH_API_URL, DARTMOUTH_API_KEY, scopes, shard, hedge, tracer, employee_query, run_deadline, pager), args.resume, fetch_params)
+            excluded_crew_codes = load_excluded_crew_codes()
+            mirror = planon_mirror.PlanonMirror(args.mirror, full_resync_interval=args.full_resync_interval) if args.mirror else None
+            with tracer.span("planon_data", cat="phase"):
+                pln_trades_by_syscodes, pln_trades_by_codes, pln_laborgroups_by_syscodes, pln_laborgroups_by_codes, pln_persons = get_planon_data(shard, mirror, hedge, tracer, run_deadline)
+        except deadline.DeadlineExceeded as ex:
+            # nothing was written yet, a rerun starts over
+            log.error(f"Stopped before any update: {ex}")
+            signal.signal(signal.SIGTERM, previous_sigterm_handler)
+            if args.results_file:
+                sharding.write_results(args.results_file, shard, [], [], [], sharding.EXIT_PARTIAL)
+            sys.exit(sharding.EXIT_PARTIAL)
+        finally:
+            # only the reads are hedged, and they are done
+            if hedge:
+                hedge.shutdown()
+
+        log.info("Starting trade and labor group feed to Planon for UPDATES")
+
+        # one keep-alive session for every partial update, retrying server errors; a write sent before the deadline isn't cut short
+        planon_session = tracer.instrument(run_deadline.bind(utils.write_session(), cap_timeout=False))
+
+        def apply_crew_update(pln_person, trade_ref, laborgroup_ref):
+            if args.full_save:
+                pln_person.WorkingHoursTariffGroupRef = laborgroup_ref
+                pln_person.TradeRef = trade_ref
+                with tracer.span("Person.save", cat="planon", netid=pln_person.NetID):
+                    pln_person.save()
             else:
-                log.debug(f"Record {pln_person.NetID} skipped, already has the correct trade & labor group for {active_crew_code}")
-                skipped_netids.append(pln_person.NetID)
-
-        except Exception as ex:
-            log.exception(f"Failed to update {dart_employee['netid']} due to {ex}")
-            failed_netids.append({"netid": dart_employee["netid"], "exception": ex})
-        
-    log.info(f"Total number of successful trade and labor group updates: {len(updated_netids)}")
-    log.info(f"Total number of skipped employees, who have correct crew in Planon: {len(skipped_netids)}")
-    log.info(f"Total number of failures : {len(failed_netids)}")
+                # only TradeRef and WorkingHoursTariffGroupRef cross the wire, concurrent edits to other fields are kept
+                with tracer.tagged(netid=pln_person.NetID):
+                    utils.update_person_crew(url=PLANON_API_URL, jwt=PLANON_API_KEY, syscode=pln_person.Syscode, trade_ref=trade_ref, laborgroup_ref=laborgroup_ref, session=planon_session)
+                if mirror:
+                    mirror.set_crew(pln_person.Syscode, trade_ref, laborgroup_ref)
+
+        updated_netids = []
+        skipped_netids = []
+        failed_netids = []
+        pending_writes = []
+
+        # COMPARE: every employee first, the writes are applied afterwards by priority
+        with tracer.span("compare", cat="phase"):
+            for dart_employee in dart_employees.values():
+                log.debug(f"Processing {dart_employee['netid']}")
+
+                # RESUME: skip netids applied by the previous run from the same inputs
+                inputs_hash = checkpoint.input_hash(dart_employee, excluded_crew_codes)
+                applied = applied_netids.get(dart_employee["netid"])
+                if applied and applied["hash"] == inputs_hash:
+                    log.debug(f"Record {dart_employee['netid']} already {applied['status']} by the previous run")
+                    (updated_netids if applied["status"] == "updated" else skipped_netids).append(dart_employee["netid"])
+                    continue
+
+                try:
+                    active_crew_code = utils.get_active_facilities_crew_code(dart_employee)
+
+                    # no crew in iPaaS and no Planon person: outside the facilities population
+                    if not active_crew_code and dart_employee["netid"] not in pln_persons:
+                        continue
+
+                    pln_person = pln_persons[dart_employee["netid"]]
+
+                    needs_update, trade_ref, laborgroup_ref = utils.get_crew_update(active_crew_code, pln_person, pln_trades_by_syscodes, pln_trades_by_codes, pln_laborgroups_by_syscodes, pln_laborgroups_by_codes, excluded_crew_codes)
+
+                    # UPDATES to trade and labor group:
+                    if needs_update:
+                        pending_writes.append(deadline.pending_write(pln_person.NetID, pln_person, trade_ref, laborgroup_ref, inputs_hash, active_crew_code))
+                    else:
+                        log.debug(f"Record {pln_person.NetID} skipped, already has the correct trade & labor group for {active_crew_code}")
+                        skipped_netids.append(pln_person.NetID)
+                        run_checkpoint.record(pln_person.NetID, inputs_hash, "skipped")
+
+                except Exception as ex:
+                    log.exception(f"Failed to update {dart_employee['netid']} due to {ex}")
+                    failed_netids.append({"netid": dart_employee["netid"], "exception": ex})
+
+        # ****************************************************************************************************************
+        # STALE crews: Planon persons with a trade or labor group that iPaaS no longer gives them
+        # computed from pln_persons and dart_employees already fetched above, netids the forward pass handled are left out
+        # ****************************************************************************************************************
+
+        # with --netid only those netids were fetched from iPaaS, so only those can be stale
+        pln_persons_in_scope = {netid: pln_person for netid, pln_person in pln_persons.items() if not args.netid or netid in args.netid}
+        processed_netids = set(updated_netids) | set(skipped_netids) | {failed["netid"] for failed in failed_netids} | {write.netid for write in pending_writes}
+        stale_netids = sorted(utils.get_stale_crew_netids(pln_persons_in_scope, dart_employees) - processed_netids)
+        log.info(f"Total number of Planon persons with a stale trade or labor group: {len(stale_netids)}")
+
+        # an empty or truncated fetch makes every Planon crew look stale, so a mass clear is refused and the build is unstable
+        pln_persons_with_crew = sum(1 for pln_person in pln_persons_in_scope.values() if pln_person.TradeRef is not None or pln_person.WorkingHoursTariffGroupRef is not None)
+        stale_clear_refused = False
+        if args.clear_stale and stale_netids:
+            if not dart_employees or len(stale_netids) > args.max_stale_fraction * pln_persons_with_crew:
+                log.error(f"Refusing to clear {len(stale_netids)} stale crews of {pln_persons_with_crew} Planon persons with a crew from {len(dart_employees)} iPaaS employees, more than --max-stale-fraction {args.max_stale_fraction}")
+                stale_clear_refused = True
+            else:
+                stale_batch = stale_netids[:args.stale_batch_size]
+                if len(stale_batch) < len(stale_netids):
+                    log.info(f"Clearing {len(stale_batch)} of {len(stale_netids)} stale crews, the next runs clear the rest")
+                pending_writes.extend(deadline.PendingWrite(deadline.CLEAR_STALE_CREW, netid, pln_persons[netid], None, None) for netid in stale_batch)
+
+        # ****************************************************************************************************************
+        # APPLY: new crews, then clears, then stale clears, until the deadline or SIGTERM
+        # ****************************************************************************************************************
+
+        cleared_netids = []
+        deferred_netids = []
+
+        with tracer.span("updates", cat="phase"):
+            pending_writes = deadline.prioritized(pending_writes)
+            for index, write in enumerate(pending_writes):
+                if run_deadline.expired:
+                    deferred_netids = [pending.netid for pending in pending_writes[index:]]
+                    log.warning(f"{run_deadline.reason()}, {len(deferred_netids)} writes left for the next run")
+                    break
+
+                try:
+                    log.info(f"Syncing {write.netid}")
+                    apply_crew_update(write.pln_person, write.trade_ref, write.laborgroup_ref)
+
+                    if write.priority == deadline.CLEAR_STALE_CREW:
+                        cleared_netids.append(write.netid)
+                        log.info(f"Record {write.netid} stale crew cleared")
+                    else:
+                        updated_netids.append(write.netid)
+                        run_checkpoint.record(write.netid, write.inputs_hash, "updated")
+                        log.info(f"Record {write.netid} updated with {write.active_crew_code}")
+
+                except deadline.DeadlineExceeded as ex:
+                    # ran out between the check and the request, nothing was sent
+                    deferred_netids = [pending.netid for pending in pending_writes[index:]]
+                    log.warning(f"{ex}, {len(deferred_netids)} writes left for the next run")
+                    break
+                except Exception as ex:
+                    log.exception(f"Failed to update {write.netid} due to {ex}")
+                    failed_netids.append({"netid": write.netid, "exception": ex})
+
+        signal.signal(signal.SIGTERM, previous_sigterm_handler)
+
+        log.info(f"Total number of successful trade and labor group updates: {len(updated_netids)}")
+        log.info(f"Total number of skipped employees, who have correct crew in Planon: {len(skipped_netids)}")
+        log.info(f"Total number of failures : {len(failed_netids)}")
 
 # ****************************************************************************************************************
-    log.info(
-        f"""Logging results\n
+        log.info(
+            f"""Logging results\n
     # ======================= RESULTS ======================= #
 
     UPDATED:
@@ -225,24 +398,49 @@ def main():
     SKIPPED:
     Employees skipped : {len(skipped_netids)} \n
 
+    STALE:
+    Planon persons with a crew iPaaS no longer gives: {len(stale_netids)} {stale_netids} \n
+    Cleared: {len(cleared_netids)} \n
+
+    DEFERRED:
+    Writes left when the run was stopped: {len(deferred_netids)} {deferred_netids} \n
+
     FAILED:
     Employees failed updating: {len(failed_netids)} {failed_netids}\n
 
     """
-    )
+        )
+
+        # *************************************************************************************************
+        # Set exit code
+        # *************************************************************************************************
+
+        exit_code = sharding.EXIT_PARTIAL if deferred_netids else get_exit_code(failed_netids)
+        if stale_clear_refused and exit_code == sharding.EXIT_OK:
+            exit_code = sharding.EXIT_UNSTABLE
 
-    # *************************************************************************************************
-    # Set exit code
-    # *************************************************************************************************
+        if args.results_file:
+            sharding.write_results(args.results_file, shard, updated_netids, skipped_netids, failed_netids, exit_code, stale_netids, cleared_netids, deferred_netids)
 
-    # Check if any failed_netid has KeyError for trade, labor group or personnel record , if so then mark unstable build 
+        sys.exit(exit_code)
+    finally:
+        tracer.write()
+
+# ****************************************************************************************************************
+# get_exit_code
+# Check if any failed_netid has KeyError for trade, labor group or personnel record , if so then mark unstable build 
+# ****************************************************************************************************************
+
+def get_exit_code(failed_netids):
     for failed_netid in failed_netids:
         if isinstance(failed_netid["exception"], KeyError) :
             log.warning(f"Unstable build - {len(failed_netids)} failure due to archived trade , labor group or keyerror for a personnel record")
-            sys.exit(57)  #unstable build exit code
+            return sharding.EXIT_UNSTABLE  #unstable build exit code
         else:
             log.info("Updates were processed successfully, exiting")
-            sys.exit(os.EX_OK)  # Set exit code indicating successful execution
+            return sharding.EXIT_OK  # Set exit code indicating successful execution
+
+    return sharding.EXIT_OK
 
 # ****************************************************************************************************************
 # main() allows to execute code When the file Runs as a Script, but not when its imported as a Module
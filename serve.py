@@ -0,0 +1,127 @@
+import argparse
+import signal
+import threading
+
+import requests
+
+import planon
+
+import main
+from ipaas import utils
+from ipaas import daemon
+from ipaas import decoding
+
+log = main.log
+
+# *********************************************************************
+# SERVE
+# Long running daemon: keeps the crew code catalog and a slim Planon person index warm,
+# and reconciles single employees as employee-changed events arrive
+#
+# python serve.py --port 8080
+# curl -X POST localhost:8080/events -d '{"netid": "f007dch"}'
+#
+# PLANON_API_URL and DARTMOUTH_API_URL can point at local stand-in servers
+# *********************************************************************
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Reconcile crew codes for employee-changed events")
+    parser.add_argument("--host", default=daemon.HOST, help="interface to listen on")
+    parser.add_argument("--port", type=int, default=daemon.PORT, help="port to listen on")
+    parser.add_argument("--refresh-interval", type=float, default=daemon.REFRESH_INTERVAL, help="seconds between warm state refreshes")
+
+    return parser.parse_args(argv)
+
+# *********************************************************************
+# load_state - catalog & person index, from the same Planon reads as main.py
+# *********************************************************************
+
+def load_state():
+    pln_trades_by_syscodes, pln_trades_by_codes, pln_laborgroups_by_syscodes, pln_laborgroups_by_codes, pln_persons = main.get_planon_data()
+
+    catalog = daemon.Catalog(pln_trades_by_syscodes, pln_trades_by_codes, pln_laborgroups_by_syscodes, pln_laborgroups_by_codes)
+    persons = {netid: daemon.slim_person(pln_person) for netid, pln_person in pln_persons.items()}
+
+    return catalog, persons
+
+# *********************************************************************
+# find_person - one Planon person by NetID, for events about persons missing from the warm index
+# *********************************************************************
+
+def find_person(netid):
+    pln_persons = [pln_person for pln_person in planon.Person.find({"filter": {"FreeString7": {"eq": netid}}}) if not pln_person.IsArchived]
+    return daemon.slim_person(pln_persons[0]) if pln_persons else None
+
+# *********************************************************************
+# EmployeeFetcher - one employee from iPaaS, with a jwt renewed when it expires
+# *********************************************************************
+
+class EmployeeFetcher:
+
+    def __init__(self, DARTMOUTH_API_URL, DARTMOUTH_API_KEY, scopes):
+        self.DARTMOUTH_API_URL = DARTMOUTH_API_URL
+        self.DARTMOUTH_API_KEY = DARTMOUTH_API_KEY
+        self.scopes = scopes
+        self.session = requests.Session()
+        self.jwt = None
+        self._lock = threading.Lock()
+
+    def renew_jwt(self):
+        with self._lock:
+            self.jwt = utils.get_jwt(url=f"{self.DARTMOUTH_API_URL}/api/jwt", key=self.DARTMOUTH_API_KEY, scopes=self.scopes, session=self.session)
+
+    def __call__(self, netid):
+        if self.jwt is None:
+            self.renew_jwt()
+
+        url = f"{self.DARTMOUTH_API_URL}/api/employees/{netid}"
+        try:
+            return utils.get_resource(jwt=self.jwt, url=url, session=self.session, decode=decoding.decode_employee)
+        except requests.HTTPError as ex:
+            if ex.response is None or ex.response.status_code != 401:
+                raise
+            self.renew_jwt()
+            return utils.get_resource(jwt=self.jwt, url=url, session=self.session, decode=decoding.decode_employee)
+
+# ****************************************************************************************************************
+# MAIN
+# ****************************************************************************************************************
+
+def serve(argv=None):
+    args = parse_args(argv)
+
+    PLANON_API_URL, PLANON_API_KEY, DARTMOUTH_API_URL, DARTMOUTH_API_KEY, headers, scopes = main.setup()
+    planon_session = utils.write_session()
+
+    def apply_update(pln_person, trade_ref, laborgroup_ref):
+        utils.update_person_crew(url=PLANON_API_URL, jwt=PLANON_API_KEY, syscode=pln_person.Syscode, trade_ref=trade_ref, laborgroup_ref=laborgroup_ref, session=planon_session)
+
+    state = daemon.WarmState(load_state, refresh_interval=args.refresh_interval)
+    state.start()
+
+    reconciler = daemon.Daemon(
+        state,
+        fetch_employee=EmployeeFetcher(DARTMOUTH_API_URL, DARTMOUTH_API_KEY, scopes),
+        apply_update=apply_update,
+        excluded_crew_codes=main.load_excluded_crew_codes(),
+        host=args.host,
+        port=args.port,
+        find_person=find_person,
+    )
+    reconciler.start()
+
+    # run until the container is stopped
+    stopped = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopped.set())
+    try:
+        stopped.wait()
+    except KeyboardInterrupt:
+        pass
+
+    log.info("Stopping")
+    reconciler.stop()
+
+# ****************************************************************************************************************
+# serve() allows to execute code When the file Runs as a Script, but not when its imported as a Module
+if __name__ == "__main__":
+    serve()
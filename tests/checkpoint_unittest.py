@@ -0,0 +1,75 @@
+import os
+import tempfile
+import unittest
+
+from ipaas import checkpoint
+
+
+class TestCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.checkpoint = checkpoint.Checkpoint(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_input_hash(self):
+        employee = {"netid": "f00207h", "jobs": [{"maintenance_crew": {"crew_code": "ACS"}, "job_current_status": "Active"}]}
+        changed = {"netid": "f00207h", "jobs": [{"maintenance_crew": {"crew_code": "BAS"}, "job_current_status": "Active"}]}
+
+        self.assertEqual(checkpoint.input_hash(employee, ["ML", "CEOPS"]), checkpoint.input_hash(dict(employee, name="x"), ["CEOPS", "ML"]))
+        self.assertNotEqual(checkpoint.input_hash(employee, ["ML", "CEOPS"]), checkpoint.input_hash(changed, ["ML", "CEOPS"]))
+
+    def test_journal(self):
+        self.checkpoint.record("f00207h", "abc", "updated")
+        self.checkpoint.record("d28941t", "def", "skipped")
+
+        # a run killed while writing leaves a torn last line
+        with open(self.checkpoint.journal_path, "a") as f:
+            f.write('{"netid": "f0')
+
+        applied = self.checkpoint.applied()
+
+        self.assertEqual(applied["f00207h"], {"hash": "abc", "status": "updated"})
+        self.assertEqual(applied["d28941t"], {"hash": "def", "status": "skipped"})
+        self.assertEqual(len(applied), 2)
+
+    def test_record_after_torn_line(self):
+        self.checkpoint.record("f00207h", "abc", "updated")
+        with open(self.checkpoint.journal_path, "a") as f:
+            f.write('{"netid": "f0')
+
+        # the resumed run appends after the torn line
+        self.checkpoint.record("d28941t", "def", "skipped")
+
+        self.assertEqual(self.checkpoint.applied(), {"f00207h": {"hash": "abc", "status": "updated"}, "d28941t": {"hash": "def", "status": "skipped"}})
+
+    def test_fetch_reuses_fresh_snapshot(self):
+        calls = []
+        fetch = lambda: calls.append(1) or {"f00207h": {"netid": "f00207h"}}
+
+        first = self.checkpoint.fetch("dart_employees", fetch, resume=False)
+        second = self.checkpoint.fetch("dart_employees", fetch, resume=True)
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(calls), 1)
+
+    def test_fetch_refetches_stale_snapshot(self):
+        self.checkpoint.save("dart_employees", {"old": True})
+        self.checkpoint.max_snapshot_age = -1
+
+        self.assertEqual(self.checkpoint.fetch("dart_employees", lambda: {"new": True}, resume=True), {"new": True})
+
+    def test_reset(self):
+        self.checkpoint.record("f00207h", "abc", "updated")
+        self.checkpoint.save("dart_employees", {})
+
+        self.checkpoint.reset()
+
+        self.assertEqual(self.checkpoint.applied(), {})
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
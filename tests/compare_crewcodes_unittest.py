@@ -1,62 +1,32 @@
-import os
 import unittest
-import planon
 
-from tests import compare_crewcodes
+from ipaas import utils
+from tests import fixtures
 
 # *********************************************************************
 # SETUP
+# Planon trades & labor groups replayed from tests/recordings/planon
 # *********************************************************************
 
-planon.PlanonResource.set_site(site=os.environ["PLANON_API_URL"])
-planon.PlanonResource.set_header(jwt=os.environ["PLANON_API_KEY"])
+pln_trades_by_syscodes, pln_trades_by_codes, pln_laborgroups_by_syscodes, pln_laborgroups_by_codes = fixtures.planon_catalog()
 
-# Planon API
-PLANON_API_URL = os.environ["PLANON_API_URL"]
-PLANON_API_KEY = os.environ["PLANON_API_KEY"]
-
-# Dartmouth iPaaS
-DARTMOUTH_API_URL = os.environ["DARTMOUTH_API_URL"]
-DARTMOUTH_API_KEY = os.environ["DARTMOUTH_API_KEY"]
-
-headers = {"Authorization": DARTMOUTH_API_KEY}
-scopes = "urn:dartmouth:employees:read.sensitive"
-
-
-# ****************************************************************************************************************
-
-pln_trades = planon.Trade.find()
-pln_trades_by_syscodes = {trade.Syscode: trade for trade in pln_trades}
-pln_trades_by_codes = {trade.Code: trade for trade in pln_trades}
-
-pln_laborgroups = planon.WorkingHoursTariffGroup.find()
-pln_laborgroups_by_syscodes = {laborgroup.Syscode: laborgroup for laborgroup in pln_laborgroups if laborgroup.Code}
-pln_laborgroups_by_codes = {laborgroup.Code: laborgroup for laborgroup in pln_laborgroups if laborgroup.Code}
+excluded_crew_codes = ['ML', 'CEOPS']
 
 
 # ****************************************************************************************************************
 class TestCompareCodes(unittest.TestCase):
-    
+
     def test_match_crewcodes(self):
-        """       
+        """
         Test matching crew codes.
-        Asserts that compare_crewcodes_test function correctly matches crew codes.
+        Asserts that compare_crewcodes function correctly matches crew codes.
         """
-     
-        active_crew_code = 'HLS'      
-
-        pln_person = {
-        'd20171b': {            
-            'Code': 'PER0087392',
-            'LastName':'Moriarty',
-            'TradeRef': 263,
-            'WorkingHoursTariffGroupRef': 93
-            }
-        }
 
-        excluded_crew_codes = ['ML', 'CEOPS']
-        
-        ipaas_trade, ipaas_labor_group, pln_trade_code, pln_laborgroup_code = compare_crewcodes.compare_crewcodes_test(active_crew_code,pln_person,pln_trades_by_syscodes,pln_laborgroups_by_syscodes, excluded_crew_codes)
+        active_crew_code = 'HLS'
+
+        pln_person = fixtures.planon_person(Code='PER0087392', LastName='Moriarty', NetID='d20171b', TradeRef=263, WorkingHoursTariffGroupRef=93)
+
+        ipaas_trade, ipaas_labor_group, pln_trade_code, pln_laborgroup_code = utils.compare_crewcodes(active_crew_code, pln_person, pln_trades_by_syscodes, pln_laborgroups_by_syscodes, excluded_crew_codes)
 
         self.assertEqual(ipaas_trade, 'HLS')
         self.assertEqual(ipaas_labor_group, 'HLS')
@@ -65,24 +35,15 @@ class TestCompareCodes(unittest.TestCase):
 
 
     def test_non_match_codes(self):
-        """       
+        """
         Test non-matching crew codes.
-        Asserts that compare_crewcodes_test function does not match with crew codes.
+        Asserts that compare_crewcodes function does not match with crew codes.
         """
         active_crew_code ='BAS'
-        
-        pln_person = {
-        'd20171b': {            
-            'Code': 'PER0087392',
-            'LastName':'Moriarty',
-            'TradeRef': 115,
-            'WorkingHoursTariffGroupRef': 73
-            }
-        }
 
-        excluded_crew_codes = ['ML', 'CEOPS']
-            
-        ipaas_trade, ipaas_labor_group, pln_trade_code, pln_laborgroup_code = compare_crewcodes.compare_crewcodes_test(active_crew_code, pln_person, pln_trades_by_syscodes, pln_laborgroups_by_syscodes, excluded_crew_codes)
+        pln_person = fixtures.planon_person(Code='PER0087392', LastName='Moriarty', NetID='d20171b', TradeRef=115, WorkingHoursTariffGroupRef=73)
+
+        ipaas_trade, ipaas_labor_group, pln_trade_code, pln_laborgroup_code = utils.compare_crewcodes(active_crew_code, pln_person, pln_trades_by_syscodes, pln_laborgroups_by_syscodes, excluded_crew_codes)
 
         self.assertNotEqual(ipaas_trade, 'HLS')
         self.assertNotEqual(ipaas_labor_group, 'HLS')
@@ -91,25 +52,16 @@ class TestCompareCodes(unittest.TestCase):
 
 
     def test_no_trade(self):
-        """       
+        """
         Test when pln_person does not have a trade with TradeRef=None .
-   
+
         """
-         
+
         active_crew_code ='HLS'
-        
-        pln_person = {
-        'd20171b': {            
-            'Code': 'PER0087392',
-            'LastName':'Moriarty',
-            'TradeRef':None,
-            'WorkingHoursTariffGroupRef': 93
-            }
-        }
 
-        excluded_crew_codes = ['ML', 'CEOPS']
+        pln_person = fixtures.planon_person(Code='PER0087392', LastName='Moriarty', NetID='d20171b', TradeRef=None, WorkingHoursTariffGroupRef=93)
 
-        ipaas_trade, ipaas_labor_group, pln_trade_code, pln_laborgroup_code = compare_crewcodes.compare_crewcodes_test(active_crew_code, pln_person, pln_trades_by_syscodes, pln_laborgroups_by_syscodes, excluded_crew_codes)
+        ipaas_trade, ipaas_labor_group, pln_trade_code, pln_laborgroup_code = utils.compare_crewcodes(active_crew_code, pln_person, pln_trades_by_syscodes, pln_laborgroups_by_syscodes, excluded_crew_codes)
 
         self.assertEqual(ipaas_trade, 'HLS')
         self.assertEqual(ipaas_labor_group, 'HLS')
@@ -117,27 +69,18 @@ class TestCompareCodes(unittest.TestCase):
         self.assertEqual(pln_laborgroup_code, 'HLS')
 
 
-        
+
     def test_no_lg(self):
-        """       
+        """
         Test when pln_person does not have a trade with 'WorkingHoursTariffGroupRef': None
-   
+
         """
-         
+
         active_crew_code ='HLS'
-        
-        pln_person = {
-        'd20171b': {            
-            'Code': 'PER0087392',
-            'LastName':'Moriarty',
-            'TradeRef':263,
-            'WorkingHoursTariffGroupRef': None
-            }
-        }
 
-        excluded_crew_codes = ['ML', 'CEOPS']
-            
-        ipaas_trade, ipaas_labor_group, pln_trade_code, pln_laborgroup_code =compare_crewcodes.compare_crewcodes_test(active_crew_code, pln_person, pln_trades_by_syscodes, pln_laborgroups_by_syscodes, excluded_crew_codes)
+        pln_person = fixtures.planon_person(Code='PER0087392', LastName='Moriarty', NetID='d20171b', TradeRef=263, WorkingHoursTariffGroupRef=None)
+
+        ipaas_trade, ipaas_labor_group, pln_trade_code, pln_laborgroup_code = utils.compare_crewcodes(active_crew_code, pln_person, pln_trades_by_syscodes, pln_laborgroups_by_syscodes, excluded_crew_codes)
 
         self.assertEqual(ipaas_trade, 'HLS')
         self.assertEqual(ipaas_labor_group, 'HLS')
@@ -145,31 +88,69 @@ class TestCompareCodes(unittest.TestCase):
         self.assertNotEqual(pln_laborgroup_code, 'HLS')
 
 
-        
+
     def test_excluded(self):
         """
         Test behavior when crew code is excluded.
 
         Checks if the function behaves correctly when the active crew code is in the list of excluded crew codes.
-        """        
+        """
         active_crew_code ='ML'
-        
-        pln_person = {
-        'd20171b': {            
-            'Code': 'PER0087392',
-            'LastName':'Moriarty',
-            'TradeRef':None,
-            'WorkingHoursTariffGroupRef': 60
-            }
-        }
 
-        excluded_crew_codes = ['ML', 'CEOPS']
-            
-        ipaas_trade, ipaas_labor_group, pln_trade_code, pln_laborgroup_code = compare_crewcodes.compare_crewcodes_test(active_crew_code, pln_person, pln_trades_by_syscodes, pln_laborgroups_by_syscodes, excluded_crew_codes)
+        pln_person = fixtures.planon_person(Code='PER0087392', LastName='Moriarty', NetID='d20171b', TradeRef=None, WorkingHoursTariffGroupRef=60)
+
+        ipaas_trade, ipaas_labor_group, pln_trade_code, pln_laborgroup_code = utils.compare_crewcodes(active_crew_code, pln_person, pln_trades_by_syscodes, pln_laborgroups_by_syscodes, excluded_crew_codes)
 
         self.assertNotEqual(ipaas_trade, None)
         self.assertNotEqual(ipaas_labor_group, None)
         self.assertNotEqual(pln_trade_code, None)
         self.assertNotEqual(pln_laborgroup_code, None)
+        self.assertEqual(ipaas_trade, '')
+        self.assertEqual(pln_laborgroup_code, 'ML')
+
+
+class TestGetCrewUpdate(unittest.TestCase):
+
+    def get_crew_update(self, active_crew_code, pln_person):
+        return utils.get_crew_update(active_crew_code, pln_person, pln_trades_by_syscodes, pln_trades_by_codes, pln_laborgroups_by_syscodes, pln_laborgroups_by_codes, excluded_crew_codes)
+
+    def test_no_update(self):
+        pln_person = fixtures.planon_person(NetID='d20171b', TradeRef=263, WorkingHoursTariffGroupRef=93)
+        self.assertEqual(self.get_crew_update('HLS', pln_person), (False, 263, 93))
+
+    def test_update(self):
+        pln_person = fixtures.planon_person(NetID='d20171b', TradeRef=263, WorkingHoursTariffGroupRef=93)
+        self.assertEqual(self.get_crew_update('ACS', pln_person), (True, 115, 73))
+
+    def test_clear(self):
+        pln_person = fixtures.planon_person(NetID='d20171b', TradeRef=263, WorkingHoursTariffGroupRef=93)
+        self.assertEqual(self.get_crew_update('', pln_person), (True, None, None))
+
+    def test_unknown_crew_code(self):
+        pln_person = fixtures.planon_person(NetID='d20171b')
+        self.assertRaises(KeyError, self.get_crew_update, 'XYZ', pln_person)
+
+
+class TestGetStaleCrewNetids(unittest.TestCase):
+
+    def test_stale_crews(self):
+        pln_persons = {
+            "d20171b": fixtures.planon_person(NetID="d20171b", TradeRef=263, WorkingHoursTariffGroupRef=93),  # still HLS
+            "f00207h": fixtures.planon_person(NetID="f00207h", TradeRef=115),  # lost the crew in iPaaS
+            "d13523b": fixtures.planon_person(NetID="d13523b", WorkingHoursTariffGroupRef=53),  # left the feed
+            "f003841": fixtures.planon_person(NetID="f003841", TradeRef=117, IsArchived=True),
+            "f000000": fixtures.planon_person(NetID="f000000"),  # no crew to clear
+            "f007dch": fixtures.planon_person(NetID="f007dch", TradeRef=263),  # conflicting crews, left to the forward pass
+        }
+        dart_employees = {
+            "d20171b": {"netid": "d20171b", "jobs": [{"maintenance_crew": {"crew_code": "HLS"}, "job_current_status": "Active"}]},
+            "f00207h": {"netid": "f00207h", "jobs": [{"maintenance_crew": {"crew_code": "ACS"}, "job_current_status": "Inactive"}]},
+            "f000000": {"netid": "f000000", "jobs": None},
+            "f007dch": {"netid": "f007dch", "jobs": [{"maintenance_crew": {"crew_code": "ACS"}, "job_current_status": "Active"}, {"maintenance_crew": {"crew_code": "HLS"}, "job_current_status": "Active"}]},
+        }
+
+        self.assertEqual(utils.get_stale_crew_netids(pln_persons, dart_employees), {"f00207h", "d13523b"})
 
 
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,169 @@
+import json
+import threading
+import unittest
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import requests
+
+from ipaas import daemon
+from ipaas import utils
+
+# *********************************************************************
+# LOCAL STAND-IN SERVERS for iPaaS employees and Planon persons
+# *********************************************************************
+
+EMPLOYEES = {
+    "f00207h": {"netid": "f00207h", "jobs": [{"maintenance_crew": {"crew_code": "ACS"}, "job_current_status": "Active"}]},
+    "d28941t": {"netid": "d28941t", "jobs": [{"maintenance_crew": {"crew_code": "HLS"}, "job_current_status": "Active"}]},
+    "f007dch": {"netid": "f007dch", "jobs": [{"maintenance_crew": {"crew_code": "ACS"}, "job_current_status": "Active"}]},
+}
+
+# in Planon, but created after the warm index was loaded
+NEW_PERSONS = {"f007dch": daemon.SlimPerson(1003, "f007dch", None, None)}
+
+PATCHES = []
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        employee = EMPLOYEES.get(self.path.rsplit("/", 1)[-1])
+        self.send_response(200 if employee else 404)
+        self.end_headers()
+        self.wfile.write(json.dumps(employee).encode())
+
+    def do_PATCH(self):
+        PATCHES.append((self.path, json.loads(self.rfile.read(int(self.headers["Content-Length"])))))
+        self.send_response(200)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def load_state():
+    trades = [SimpleNamespace(Syscode=263, Code="HLS"), SimpleNamespace(Syscode=115, Code="ACS")]
+    laborgroups = [SimpleNamespace(Syscode=93, Code="HLS"), SimpleNamespace(Syscode=73, Code="ACS")]
+
+    catalog = daemon.Catalog(
+        {trade.Syscode: trade for trade in trades},
+        {trade.Code: trade for trade in trades},
+        {laborgroup.Syscode: laborgroup for laborgroup in laborgroups},
+        {laborgroup.Code: laborgroup for laborgroup in laborgroups},
+    )
+    persons = {
+        "f00207h": daemon.SlimPerson(1001, "f00207h", 263, 93),  # HLS in Planon, ACS in iPaaS
+        "d28941t": daemon.SlimPerson(1002, "d28941t", 263, 93),  # HLS on both sides
+    }
+    return catalog, persons
+
+
+class TestDaemon(unittest.TestCase):
+
+    def setUp(self):
+        PATCHES.clear()
+
+        self.stand_in = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+        threading.Thread(target=self.stand_in.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+        stand_in_url = f"http://127.0.0.1:{self.stand_in.server_address[1]}"
+
+        session = requests.Session()
+
+        def fetch_employee(netid):
+            return utils.get_resource(jwt="jwt", url=f"{stand_in_url}/api/employees/{netid}", session=session)
+
+        def apply_update(pln_person, trade_ref, laborgroup_ref):
+            utils.update_person_crew(url=stand_in_url, jwt="jwt", syscode=pln_person.Syscode, trade_ref=trade_ref, laborgroup_ref=laborgroup_ref, session=session)
+
+        self.state = daemon.WarmState(load_state, refresh_interval=3600)
+        self.state.start()
+        self.daemon = daemon.Daemon(self.state, fetch_employee, apply_update, ["ML", "CEOPS"], port=0, find_person=NEW_PERSONS.get)
+        self.daemon.start()
+        self.url = f"http://127.0.0.1:{self.daemon.address[1]}"
+
+    def tearDown(self):
+        self.daemon.stop()
+        self.stand_in.shutdown()
+        self.stand_in.server_close()
+
+    def post(self, path, body):
+        request = urllib.request.Request(f"{self.url}{path}", data=json.dumps(body).encode(), method="POST")
+        with urllib.request.urlopen(request) as response:
+            return response.status, json.loads(response.read())
+
+    def test_reconcile(self):
+        status, results = self.post("/reconcile", {"netids": ["f00207h", "d28941t", "f000000"]})
+
+        self.assertEqual(status, 200)
+        self.assertEqual(results, {"f00207h": "updated", "d28941t": "skipped", "f000000": "not_found"})
+        self.assertEqual(PATCHES, [("/Person/1001", {"TradeRef": 115, "WorkingHoursTariffGroupRef": 73})])
+
+        # the warm index has the update, so a second event is a no-op
+        self.assertEqual(self.post("/reconcile", {"netid": "f00207h"})[1], {"f00207h": "skipped"})
+
+    def test_person_missing_from_the_index(self):
+        self.assertEqual(self.post("/reconcile", {"netid": "f007dch"})[1], {"f007dch": "updated"})
+
+        self.assertEqual(PATCHES, [("/Person/1003", {"TradeRef": 115, "WorkingHoursTariffGroupRef": 73})])
+        self.assertEqual(self.state.get("f007dch")[1], daemon.SlimPerson(1003, "f007dch", 115, 73))
+
+    def test_concurrent_reconciles_of_a_netid(self):
+        applying, release = threading.Event(), threading.Event()
+        updates = []
+
+        def apply_update(pln_person, trade_ref, laborgroup_ref):
+            updates.append((pln_person.Syscode, trade_ref, laborgroup_ref))
+            applying.set()
+            release.wait(5)
+
+        reconciler = daemon.Daemon(self.state, EMPLOYEES.get, apply_update, ["ML", "CEOPS"], port=0)
+        self.addCleanup(reconciler.server.server_close)
+
+        results = []
+        first = threading.Thread(target=lambda: results.append(reconciler.reconcile("f00207h")))
+        first.start()
+        applying.wait(5)
+
+        # e.g. a /reconcile request while the worker is writing the same netid
+        second = threading.Thread(target=lambda: results.append(reconciler.reconcile("f00207h")))
+        second.start()
+        release.set()
+        first.join(5)
+        second.join(5)
+
+        self.assertEqual(results, ["updated", "skipped"])
+        self.assertEqual(updates, [(1001, 115, 73)])
+        self.assertEqual(reconciler._netid_locks, {})
+
+    def test_refresh_keeps_updates_made_while_loading(self):
+        def load_while_updated():
+            catalog, persons = load_state()
+            self.state.set_person(persons["f00207h"]._replace(TradeRef=115, WorkingHoursTariffGroupRef=73))  # a reconcile during the load
+            return catalog, persons
+
+        self.state.load = load_while_updated
+        self.state.refresh()
+
+        self.assertEqual(self.state.get("f00207h")[1].TradeRef, 115)
+
+    def test_events(self):
+        status, body = self.post("/events", {"netid": "f00207h"})
+        self.daemon.queue.join()
+
+        self.assertEqual(status, 202)
+        self.assertEqual(body, {"queued": 1})
+        self.assertEqual(self.state.get("f00207h")[1].TradeRef, 115)
+
+    def test_bad_event(self):
+        request = urllib.request.Request(f"{self.url}/events", data=b'{"user": "f00207h"}', method="POST")
+        with self.assertRaises(urllib.error.HTTPError) as cm:
+            urllib.request.urlopen(request)
+
+        self.assertEqual(cm.exception.code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+from unittest import mock
+
+import requests
+
+from ipaas import deadline
+from ipaas import utils
+from tests import fixtures
+
+
+class TestDeadline(unittest.TestCase):
+
+    def test_no_deadline(self):
+        run_deadline = deadline.Deadline()
+
+        self.assertIsNone(run_deadline.remaining())
+        self.assertFalse(run_deadline.expired)
+        run_deadline.check()
+
+    def test_expires(self):
+        with fixtures.deadline_clock() as clock:
+            run_deadline = deadline.Deadline(0.01)
+            clock.advance(0.02)
+
+            self.assertTrue(run_deadline.expired)
+            self.assertRaisesRegex(deadline.DeadlineExceeded, "deadline of 0.01s exceeded", run_deadline.check)
+
+    def test_stop(self):
+        run_deadline = deadline.Deadline(3600)
+        run_deadline.stop("SIGTERM")
+
+        self.assertRaisesRegex(deadline.DeadlineExceeded, "SIGTERM", run_deadline.check)
+
+    def test_bound_session(self):
+        run_deadline = deadline.Deadline(60)
+        with fixtures.offline(fixtures.ipaas_routes()) as replay:
+            session = run_deadline.bind(requests.Session())
+            with mock.patch.object(replay, "send", wraps=replay.send) as send:
+                utils.get_resource(jwt="recorded-jwt", url=f"{fixtures.DARTMOUTH_API_URL}/api/employees/f00207h", session=session)
+                self.assertLessEqual(send.call_args.kwargs["timeout"], 60)
+
+            run_deadline.stop("SIGTERM")
+            self.assertRaises(deadline.DeadlineExceeded, utils.get_resource, jwt="recorded-jwt", url=f"{fixtures.DARTMOUTH_API_URL}/api/employees/f00207h", session=session)
+
+        self.assertEqual(len(replay.requests), 1)
+
+    def test_timeout_at_the_deadline(self):
+        def times_out(request):
+            clock.advance(0.02)
+            raise requests.ReadTimeout("read timed out")
+
+        with fixtures.offline({"GET /api/employees/f00207h": times_out}), fixtures.deadline_clock() as clock:
+            run_deadline = deadline.Deadline(0.01)
+            session = run_deadline.bind(requests.Session())
+            self.assertRaises(deadline.DeadlineExceeded, utils.get_resource, jwt="recorded-jwt", url=f"{fixtures.DARTMOUTH_API_URL}/api/employees/f00207h", session=session)
+
+    def test_timeout_before_the_deadline(self):
+        def times_out(request):
+            raise requests.ReadTimeout("read timed out")
+
+        with fixtures.offline({"GET /api/employees/f00207h": times_out}):
+            session = deadline.Deadline(60).bind(requests.Session())
+            self.assertRaises(requests.ReadTimeout, utils.get_resource, jwt="recorded-jwt", url=f"{fixtures.DARTMOUTH_API_URL}/api/employees/f00207h", session=session)
+
+    def test_uncapped_timeout(self):
+        with fixtures.offline(fixtures.ipaas_routes()) as replay:
+            session = deadline.Deadline(60).bind(requests.Session(), cap_timeout=False)
+            with mock.patch.object(replay, "send", wraps=replay.send) as send:
+                utils.update_person_crew(url=fixtures.PLANON_API_URL, jwt="planon-key", syscode=90210, trade_ref=115, laborgroup_ref=73, session=session)
+                self.assertIsNone(send.call_args.kwargs["timeout"])
+
+
+class TestPrioritized(unittest.TestCase):
+
+    def test_new_crews_first(self):
+        writes = [
+            deadline.PendingWrite(deadline.CLEAR_STALE_CREW, "d13523b", None, None, None),
+            deadline.pending_write("f00207h", None, None, None, "hash", ""),
+            deadline.pending_write("f007dch", None, 115, 73, "hash", "ACS"),
+            deadline.pending_write("d20171b", None, 263, 93, "hash", "HLS"),
+        ]
+
+        self.assertEqual([write.netid for write in deadline.prioritized(writes)], ["d20171b", "f007dch", "f00207h", "d13523b"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import json
+import unittest
+
+from ipaas import decoding
+from ipaas import utils
+from tests import fixtures
+
+PAGE = json.dumps([
+    {
+        "netid": "f007dch",
+        "name": "Hale",
+        "jobs": [
+            {"job_title": "Controls Technician", "maintenance_crew": {"crew_code": "ACS", "crew_name": "Access Control"}, "job_current_status": "Active", "supervisor": {"netid": "d20171b", "jobs": []}},
+            {"job_title": "Analyst", "job_current_status": "Active"},
+            {"maintenance_crew": None, "job_current_status": "Inactive"},
+        ],
+    },
+    {"netid": "d13523b", "jobs": None},
+    {"netid": "f000000"},
+]).encode()
+
+EXPECTED = [
+    {
+        "netid": "f007dch",
+        "jobs": [
+            {"maintenance_crew": {"crew_code": "ACS"}, "job_current_status": "Active"},
+            {"job_current_status": "Active"},
+            {"maintenance_crew": None, "job_current_status": "Inactive"},
+        ],
+    },
+    {"netid": "d13523b", "jobs": None},
+    {"netid": "f000000"},
+]
+
+
+def available_decoders():
+    decoders = {"json": decoding.decode_employees_json}
+    if decoding.orjson is not None:
+        decoders["orjson"] = decoding.decode_employees_orjson
+    if decoding.msgspec is not None:
+        decoders["msgspec"] = decoding.decode_employees_msgspec
+    return decoders
+
+
+class TestDecodeEmployees(unittest.TestCase):
+
+    def test_only_typed_fields_are_kept(self):
+        for name, decode_employees in available_decoders().items():
+            with self.subTest(decoder=name):
+                self.assertEqual(decode_employees(PAGE), EXPECTED)
+
+    def test_recorded_page_crew_codes(self):
+        content = json.dumps(fixtures.load_recording("ipaas", "employees.json")).encode()
+
+        for name, decode_employees in available_decoders().items():
+            with self.subTest(decoder=name):
+                crew_codes = [utils.get_active_facilities_crew_code(employee) for employee in decode_employees(content)]
+                self.assertEqual(crew_codes, ["HLS", "ACS", "ACS", "", "", ""])
+
+    def test_decode_employee(self):
+        self.assertEqual(decoding.decode_employee(json.dumps(json.loads(PAGE)[0]).encode()), EXPECTED[0])
+
+    def test_missing_netid(self):
+        for name, decode_employees in available_decoders().items():
+            with self.subTest(decoder=name):
+                with self.assertLogs("ipaas.decoding", level="WARNING"):
+                    self.assertEqual(decode_employees(b'[{"jobs": []}, {"netid": "f000000"}]'), [{"netid": "f000000"}])
+
+    def test_mistyped_records_are_skipped_alike(self):
+        content = json.dumps([
+            {"netid": None, "jobs": []},
+            {"netid": "f007dch", "jobs": [{"maintenance_crew": {"crew_code": 42}, "job_current_status": "Active"}]},
+            {"netid": "f00207h", "jobs": [{"maintenance_crew": "ACS", "job_current_status": "Active"}]},
+            {"netid": "f003841", "jobs": [None]},
+            {"netid": "d28941t", "jobs": "ML"},
+            {"netid": "d20171b", "last_updated": 1700000000, "jobs": [{"maintenance_crew": {"crew_code": "HLS"}, "job_current_status": "Active"}]},
+            {"netid": "d13523b", "last_updated": {"at": "2024-01-01"}, "jobs": None},
+            "f000000",
+        ]).encode()
+
+        for name, decode_employees in available_decoders().items():
+            with self.subTest(decoder=name):
+                with self.assertLogs("ipaas.decoding", level="WARNING") as logs:
+                    employees = decode_employees(content)
+
+                self.assertEqual(employees, [
+                    {"netid": "d20171b", "last_updated": 1700000000, "jobs": [{"maintenance_crew": {"crew_code": "HLS"}, "job_current_status": "Active"}]},
+                    {"netid": "d13523b", "last_updated": {"at": "2024-01-01"}, "jobs": None},
+                ])
+                self.assertEqual(len(logs.records), 6)
+
+    def test_malformed_page(self):
+        for name, decode_employees in available_decoders().items():
+            with self.subTest(decoder=name):
+                with self.assertRaises(Exception):
+                    decode_employees(b'[{"netid": "f007dch"')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,249 @@
+import io
+import json
+import os
+import re
+import sys
+from contextlib import contextmanager
+from types import SimpleNamespace
+from typing import Any, Callable
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+import planon
+
+from ipaas import deadline
+
+# *********************************************************************
+# OFFLINE FIXTURES
+# Replays recorded or synthetic Planon and iPaaS responses, so utils and the
+# main() flow run without credentials or network
+#
+# with fixtures.planon_offline() as planon_replay, fixtures.offline(fixtures.ipaas_routes()) as http_replay:
+#     ...
+# *********************************************************************
+
+RECORDINGS_DIR = os.path.join(os.path.dirname(__file__), "recordings")
+
+PLANON_API_URL = "https://planon.test/api"
+DARTMOUTH_API_URL = "https://api.dartmouth.test"
+
+ENVIRON = {
+    "PLANON_API_URL": PLANON_API_URL,
+    "PLANON_API_KEY": "planon-key",
+    "DARTMOUTH_API_URL": DARTMOUTH_API_URL,
+    "DARTMOUTH_API_KEY": "dartmouth-key",
+}
+
+
+def load_recording(*path: str) -> Any:
+    with open(os.path.join(RECORDINGS_DIR, *path), "r") as f:
+        return json.load(f)
+
+# *********************************************************************
+# PLANON - planon.Trade / WorkingHoursTariffGroup / Person find() and save()
+# *********************************************************************
+
+# Planon field names the planon client exposes under a friendlier attribute
+FIELD_ALIASES = {"FreeString7": "NetID"}
+
+
+class PlanonRecord(SimpleNamespace):
+    """Planon business object replayed from a recording, with the attributes the planon client exposes."""
+
+    def __init__(self, replay: "PlanonReplay | None" = None, **fields):
+        for field, alias in FIELD_ALIASES.items():
+            if field in fields:
+                fields[alias] = fields[field]
+        super().__init__(**fields)
+        self._replay = replay
+
+    def save(self):
+        self._replay.saved.append(self)
+        return self
+
+
+def planon_person(**fields) -> PlanonRecord:
+    """Synthetic Planon person, e.g. planon_person(NetID="d20171b", TradeRef=263, WorkingHoursTariffGroupRef=93)."""
+    return PlanonRecord(**{"Syscode": 1, "NetID": None, "TradeRef": None, "WorkingHoursTariffGroupRef": None, **fields})
+
+
+def matches(record: PlanonRecord, filter: dict[str, Any] | None) -> bool:
+    """Applies a planon find() filter such as {"filter": {"FreeString7": {"eq": "f007dch"}}} to a record."""
+    for field, conditions in (filter or {}).get("filter", {}).items():
+        value = getattr(record, FIELD_ALIASES.get(field, field), None)
+        for operator, operand in conditions.items():
+            if operator == "eq" and value != operand:
+                return False
+            if operator == "exists" and (value is not None) != operand:
+                return False
+            if operator == "in" and value not in operand:
+                return False
+            if operator == "gt" and (value is None or not value > operand):
+                return False
+            if operator == "gte" and (value is None or not value >= operand):
+                return False
+
+    return True
+
+
+class PlanonReplay:
+    """find() results per resource, and every record saved through save()."""
+
+    def __init__(self, recordings: dict[str, list[dict[str, Any]]]):
+        self.records = {resource: [PlanonRecord(self, **fields) for fields in records] for resource, records in recordings.items()}
+        self.finds: list[tuple[str, dict | None]] = []
+        self.saved: list[PlanonRecord] = []
+
+    def find(self, resource: str) -> Callable:
+        def find(filter: dict[str, Any] | None = None) -> list[PlanonRecord]:
+            self.finds.append((resource, filter))
+            return [record for record in self.records[resource] if matches(record, filter)]
+
+        return find
+
+
+def planon_recordings() -> dict[str, list[dict[str, Any]]]:
+    return {resource: load_recording("planon", f"{resource}.json") for resource in ("Trade", "WorkingHoursTariffGroup", "Person")}
+
+
+@contextmanager
+def planon_offline(recordings: dict[str, list[dict[str, Any]]] | None = None):
+    """Replays find() for planon.Trade, planon.WorkingHoursTariffGroup and planon.Person."""
+    replay = PlanonReplay(recordings or planon_recordings())
+
+    with mock.patch.object(planon.Trade, "find", staticmethod(replay.find("Trade"))), \
+            mock.patch.object(planon.WorkingHoursTariffGroup, "find", staticmethod(replay.find("WorkingHoursTariffGroup"))), \
+            mock.patch.object(planon.Person, "find", staticmethod(replay.find("Person"))):
+        yield replay
+
+
+def planon_catalog(replay: PlanonReplay | None = None):
+    """Trades & labor groups by syscodes and codes, the way main.get_planon_data() builds them."""
+    replay = replay or PlanonReplay(planon_recordings())
+    trades = replay.records["Trade"]
+    laborgroups = [laborgroup for laborgroup in replay.records["WorkingHoursTariffGroup"] if laborgroup.Code]
+
+    return (
+        {trade.Syscode: trade for trade in trades},
+        {trade.Code: trade for trade in trades},
+        {laborgroup.Syscode: laborgroup for laborgroup in laborgroups},
+        {laborgroup.Code: laborgroup for laborgroup in laborgroups},
+    )
+
+# *********************************************************************
+# HTTP - every requests.Session resolves to a ReplayAdapter, nothing leaves the process
+# routes: {"METHOD path regex": recorded(...) or callable(request) -> recorded(...)}
+# *********************************************************************
+
+def recorded(status: int = 200, body: Any = None, headers: dict[str, str] | None = None) -> dict[str, Any]:
+    return {"status": status, "body": body, "headers": headers or {}}
+
+
+class ReplayAdapter(BaseAdapter):
+
+    def __init__(self, routes: dict[str, Any]):
+        super().__init__()
+        self.routes = [(re.compile(route), response) for route, response in routes.items()]
+        self.requests: list[requests.PreparedRequest] = []
+
+    def send(self, request, **kwargs):
+        self.requests.append(request)
+        path = urlsplit(request.url).path
+
+        for route, response in self.routes:
+            if route.fullmatch(f"{request.method} {path}"):
+                if callable(response):
+                    response = response(request)
+                return self.build_response(request, response)
+
+        raise AssertionError(f"No recording for {request.method} {request.url}")
+
+    def build_response(self, request, recording):
+        body = recording["body"]
+        content = body if isinstance(body, bytes) else json.dumps(body).encode()
+
+        response = requests.Response()
+        response.status_code = recording["status"]
+        response.headers = CaseInsensitiveDict({"Content-Type": "application/json", **recording["headers"]})
+        response._content = content
+        response.raw = io.BytesIO(content)
+        response.url = request.url
+        response.request = request
+        response.reason = "OK" if response.ok else "Error"
+        return response
+
+    def close(self):
+        pass
+
+
+@contextmanager
+def offline(routes: dict[str, Any]):
+    adapter = ReplayAdapter(routes)
+    with mock.patch.object(requests.Session, "get_adapter", lambda self, url: adapter):
+        yield adapter
+
+
+def paged(employees: list[dict[str, Any]], total_count: bool = False, max_page_size: int | None = None, keyset: bool = True) -> Callable:
+    """Serves employees the way the iPaaS employees endpoint pages them, by pagesize and page.
+
+    netid_gt=<netid> instead of page serves the next page by netid (keyset pagination), unless keyset
+    is False, then it is ignored like an unknown parameter. total_count adds the X-Total-Count header,
+    max_page_size caps pagesize like a server limit.
+    """
+    def route(request):
+        query = parse_qs(urlsplit(request.url).query)
+        pagesize = min(int(query["pagesize"][0]), max_page_size or sys.maxsize)
+        headers = {"X-Total-Count": str(len(employees))} if total_count else {}
+
+        if "page" not in query:
+            after = query.get("netid_gt", [""])[0] if keyset else ""
+            return recorded(body=[employee for employee in sorted(employees, key=lambda employee: employee["netid"]) if employee["netid"] > after][:pagesize], headers=headers)
+
+        page = int(query["page"][0])
+        return recorded(body=employees[(page - 1) * pagesize:page * pagesize], headers=headers)
+
+    return route
+
+
+def ipaas_routes(employees: list[dict[str, Any]] | None = None, total_count: bool = False) -> dict[str, Any]:
+    """Recorded iPaaS jwt and employees, plus Planon person partial updates."""
+    employees = load_recording("ipaas", "employees.json") if employees is None else employees
+
+    return {
+        "POST /api/jwt": recorded(body=load_recording("ipaas", "jwt.json")),
+        "GET /api/employees": paged(employees, total_count),
+        "GET /api/employees/(?P<netid>.+)": lambda request: next(
+            (recorded(body=employee) for employee in employees if request.url.endswith(f"/{employee['netid']}")),
+            recorded(status=404, body={"message": "Not found"}),
+        ),
+        r"PATCH /api/Person/\d+": recorded(body={}),
+    }
+
+# *********************************************************************
+# CLOCK - ipaas.deadline reads a clock that only moves when the test advances it
+#
+# with fixtures.deadline_clock() as clock:
+#     clock.advance(0.2)  # e.g. from a route, a request that took longer than the deadline
+# *********************************************************************
+
+class FakeClock:
+
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@contextmanager
+def deadline_clock():
+    clock = FakeClock()
+    with mock.patch.object(deadline, "time", SimpleNamespace(monotonic=clock)):
+        yield clock
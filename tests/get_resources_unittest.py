@@ -0,0 +1,130 @@
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from ipaas import hedging
+from ipaas import utils
+from tests import fixtures
+
+
+def synthetic_employees(count):
+    return [{"netid": f"f{n:06d}", "jobs": []} for n in range(count)]
+
+
+class TestGetJwt(unittest.TestCase):
+
+    def test_get_jwt(self):
+        with fixtures.offline(fixtures.ipaas_routes()) as replay:
+            jwt = utils.get_jwt(url=f"{fixtures.DARTMOUTH_API_URL}/api/jwt", key="dartmouth-key", scopes="urn:dartmouth:employees:read.sensitive")
+
+        self.assertEqual(jwt, "recorded-jwt")
+        self.assertEqual(replay.requests[0].headers["Authorization"], "dartmouth-key")
+        self.assertTrue(replay.requests[0].url.endswith("?scope=urn:dartmouth:employees:read.sensitive"))
+
+
+class TestGetResources(unittest.TestCase):
+
+    def get_resources(self, employees):
+        with fixtures.offline(fixtures.ipaas_routes(employees)) as replay:
+            resources = utils.get_resources(jwt="recorded-jwt", url=f"{fixtures.DARTMOUTH_API_URL}/api/employees", session=requests.Session())
+        return resources, replay
+
+    def test_recorded_employees(self):
+        resources, replay = self.get_resources(None)
+
+        self.assertEqual([resource["netid"] for resource in resources], ["d20171b", "f007dch", "f00207h", "d13523b", "d28941t", "f000000"])
+        self.assertEqual(replay.requests[0].headers["Authorization"], "Bearer recorded-jwt")
+
+    def test_pages(self):
+        resources, replay = self.get_resources(synthetic_employees(2500))
+
+        self.assertEqual(len(resources), 2500)
+        self.assertEqual(len(replay.requests), 3)
+
+    def test_exact_multiple_of_page_size(self):
+        resources, replay = self.get_resources(synthetic_employees(2000))
+
+        self.assertEqual(len(resources), 2000)
+        self.assertEqual(len(replay.requests), 3)  # the last, empty, page ends the loop
+
+    def test_hedged_pages(self):
+        hedge = hedging.HedgePolicy()
+        with fixtures.offline(fixtures.ipaas_routes(synthetic_employees(2500))):
+            resources = utils.get_resources(jwt="recorded-jwt", url=f"{fixtures.DARTMOUTH_API_URL}/api/employees", session=requests.Session(), hedge=hedge)
+        hedge.shutdown()
+
+        self.assertEqual(len(resources), 2500)
+        self.assertEqual((hedge.requests, hedge.hedges), (3, 0))
+        self.assertEqual(len(hedge.latencies[f"GET {fixtures.DARTMOUTH_API_URL}/api/employees"]), 3)
+
+    def test_http_error(self):
+        routes = {"GET /api/employees": fixtures.recorded(status=503, body={"message": "Service Unavailable"})}
+        with fixtures.offline(routes):
+            self.assertRaises(requests.HTTPError, utils.get_resources, jwt="recorded-jwt", url=f"{fixtures.DARTMOUTH_API_URL}/api/employees", session=requests.Session())
+
+
+class TestGetResource(unittest.TestCase):
+
+    def test_get_resource(self):
+        with fixtures.offline(fixtures.ipaas_routes()):
+            employee = utils.get_resource(jwt="recorded-jwt", url=f"{fixtures.DARTMOUTH_API_URL}/api/employees/f00207h", session=requests.Session())
+            missing = utils.get_resource(jwt="recorded-jwt", url=f"{fixtures.DARTMOUTH_API_URL}/api/employees/x000000", session=requests.Session())
+
+        self.assertEqual(employee["netid"], "f00207h")
+        self.assertIsNone(missing)
+
+
+class TestUpdatePersonCrew(unittest.TestCase):
+
+    def test_update_person_crew(self):
+        with fixtures.offline(fixtures.ipaas_routes()) as replay:
+            utils.update_person_crew(url=fixtures.PLANON_API_URL, jwt="planon-key", syscode=90210, trade_ref=115, laborgroup_ref=None, session=requests.Session())
+
+        request = replay.requests[0]
+        self.assertEqual(request.method, "PATCH")
+        self.assertEqual(request.url, f"{fixtures.PLANON_API_URL}/Person/90210")
+        self.assertEqual(json.loads(request.body), {"TradeRef": 115, "WorkingHoursTariffGroupRef": None})
+
+    def test_rejected_update(self):
+        routes = {r"PATCH /api/Person/\d+": fixtures.recorded(status=409, body={"message": "Conflict"})}
+        with fixtures.offline(routes):
+            self.assertRaises(requests.HTTPError, utils.update_person_crew, url=fixtures.PLANON_API_URL, jwt="planon-key", syscode=90210, trade_ref=115, laborgroup_ref=73, session=requests.Session())
+
+    def test_server_error_is_retried(self):
+        statuses = [503, 200]
+        patches = []
+
+        class FlakyPlanon(BaseHTTPRequestHandler):
+
+            def do_PATCH(self):
+                patches.append(json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+                self.send_response(statuses.pop(0))
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        stand_in = ThreadingHTTPServer(("127.0.0.1", 0), FlakyPlanon)
+        threading.Thread(target=stand_in.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+        self.addCleanup(stand_in.server_close)
+        self.addCleanup(stand_in.shutdown)
+
+        utils.update_person_crew(url=f"http://127.0.0.1:{stand_in.server_address[1]}", jwt="planon-key", syscode=90210, trade_ref=115, laborgroup_ref=73, session=utils.write_session())
+
+        self.assertEqual(patches, [{"TradeRef": 115, "WorkingHoursTariffGroupRef": 73}] * 2)
+
+    def test_rejected_update_is_not_retried(self):
+        session = utils.write_session()
+        retries = session.get_adapter(f"{fixtures.PLANON_API_URL}/Person/90210").max_retries
+
+        self.assertTrue(retries.is_retry("PATCH", 503))
+        self.assertFalse(retries.is_retry("PATCH", 409))
+        self.assertFalse(retries.is_retry("PATCH", 400))
+
+
+if __name__ == '__main__':
+    unittest.main()
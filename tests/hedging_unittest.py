@@ -0,0 +1,138 @@
+import itertools
+import threading
+import unittest
+from concurrent.futures import ALL_COMPLETED, wait
+
+from ipaas import hedging
+
+# every wait below is bounded, so a regression fails the test instead of hanging it
+TIMEOUT = 5
+
+
+class TestHedgePolicy(unittest.TestCase):
+
+    def setUp(self):
+        self.started = threading.Event()  # set by the primary attempt once it runs
+        self.threshold_passed = threading.Event()
+        self.policy = hedging.HedgePolicy(min_samples=3, initial_delay=0.02, min_delay=0.01, wait=self.threshold_passes)
+
+    def tearDown(self):
+        self.policy.shutdown()
+
+    def threshold_passes(self, futures, timeout=None, return_when=ALL_COMPLETED):
+        """Waits like concurrent.futures.wait, but the hedge threshold passes as soon as the primary attempt started."""
+        if timeout is None:
+            return wait(futures, timeout=TIMEOUT, return_when=return_when)
+
+        self.started.wait(TIMEOUT)
+        try:
+            return wait(futures, timeout=0, return_when=return_when)
+        finally:
+            self.threshold_passed.set()
+
+    def threshold_never_passes(self, futures, timeout=None, return_when=ALL_COMPLETED):
+        """Waits like concurrent.futures.wait, but the primary attempt always answers before the hedge threshold."""
+        return wait(futures, timeout=TIMEOUT, return_when=return_when)
+
+    def test_fast_request_is_not_hedged(self):
+        def request():
+            self.started.set()
+            return "page"
+
+        self.policy.wait = self.threshold_never_passes
+        self.assertEqual(self.policy.run(request, key="GET"), "page")
+        self.assertEqual(self.policy.hedges, 0)
+
+    def test_slow_request_is_hedged(self):
+        calls = []
+        release = threading.Event()
+        cleaned_up = threading.Event()
+        discarded = []
+
+        def request():
+            calls.append(threading.current_thread())
+            if len(calls) == 1:
+                self.started.set()
+                release.wait(TIMEOUT)  # the first attempt is stuck, the duplicate answers
+                return "slow"
+            return "fast"
+
+        def cleanup(result):
+            discarded.append(result)
+            cleaned_up.set()
+
+        self.assertEqual(self.policy.run(request, key="GET", cleanup=cleanup), "fast")
+        self.assertEqual((self.policy.hedges, self.policy.hedge_wins), (1, 1))
+
+        release.set()
+        cleaned_up.wait(TIMEOUT)
+        self.assertEqual(discarded, ["slow"])  # the loser is cleaned up when it arrives
+
+        # attempts run on daemon threads, so exiting never waits for a discarded one
+        self.assertTrue(all(thread.daemon for thread in calls))
+
+    def test_threshold_is_percentile_of_key(self):
+        for latency in (0.1, 0.2, 0.3, 0.4):
+            self.policy._record("Person.find", latency)
+
+        self.assertEqual(self.policy.threshold("Person.find"), 0.4)
+        self.assertEqual(self.policy.threshold("Trade.find"), 0.02)  # no history yet
+
+    def test_latencies_are_timed_with_the_clock(self):
+        self.policy.clock = itertools.count(step=0.5).__next__
+        self.policy.wait = self.threshold_never_passes
+
+        for _ in range(3):
+            self.policy.run(lambda: "page", key="GET")
+
+        self.assertEqual(list(self.policy.latencies["GET"]), [0.5, 0.5, 0.5])
+        self.assertEqual(self.policy.threshold("GET"), 0.5)
+
+    def test_hedges_are_capped(self):
+        def request():
+            self.started.set()
+            self.threshold_passed.wait(TIMEOUT)  # every primary is still running at the threshold
+            return "page"
+
+        for _ in range(5):
+            self.threshold_passed.clear()
+            self.policy.run(request, key="GET")
+
+        # 5 requests * 10% + a burst of 1
+        self.assertEqual((self.policy.requests, self.policy.hedges), (5, 1))
+
+    def test_closed_policy_calls_directly(self):
+        self.policy.shutdown()
+
+        self.assertEqual(self.policy.run(lambda: "page", key="GET"), "page")
+        self.assertEqual(self.policy.requests, 0)
+
+    def test_error_is_not_hedged(self):
+        def request():
+            self.started.set()
+            raise ConnectionError("refused")
+
+        self.policy.wait = self.threshold_never_passes
+        self.assertRaises(ConnectionError, self.policy.run, request, key="GET")
+        self.assertEqual(self.policy.hedges, 0)
+
+    def test_first_success_wins_over_failure(self):
+        calls = []
+        failing = threading.Event()
+
+        def request():
+            calls.append(1)
+            if len(calls) == 1:
+                self.started.set()
+                self.threshold_passed.wait(TIMEOUT)
+                failing.set()
+                raise ConnectionError("reset")
+            failing.wait(TIMEOUT)
+            return "hedge"
+
+        self.assertEqual(self.policy.run(request, key="GET"), "hedge")
+        self.assertEqual(self.policy.hedges, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
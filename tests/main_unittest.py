@@ -0,0 +1,234 @@
+import json
+import os
+import signal
+import tempfile
+import unittest
+from unittest import mock
+
+import requests
+
+import main
+from ipaas import sharding
+from tests import fixtures
+
+
+class TestMain(unittest.TestCase):
+    """main() end to end, against recorded Planon and iPaaS responses."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.results_file = os.path.join(self.directory.name, "results.json")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def run_main(self, *args, employees=None):
+        with mock.patch.dict(os.environ, fixtures.ENVIRON), \
+                fixtures.planon_offline() as self.planon_replay, \
+                fixtures.offline(fixtures.ipaas_routes(employees)) as self.http_replay:
+            with self.assertRaises(SystemExit) as cm:
+                main.main(["--checkpoint-dir", self.directory.name, "--results-file", self.results_file, *args])
+
+        return cm.exception.code, sharding.read_results(self.results_file)
+
+    def employees_in_planon(self, *left_the_feed):
+        return [employee for employee in fixtures.load_recording("ipaas", "employees.json") if employee["netid"] not in ("d28941t", *left_the_feed)]
+
+    def patches(self):
+        return [(request.url, json.loads(request.body)) for request in self.http_replay.requests if request.method == "PATCH"]
+
+    def test_update(self):
+        exit_code, results = self.run_main("--netid", "f007dch")
+
+        self.assertEqual(exit_code, sharding.EXIT_OK)
+        self.assertEqual(results["updated"], ["f007dch"])
+        self.assertEqual(self.patches(), [(f"{fixtures.PLANON_API_URL}/Person/90210", {"TradeRef": 115, "WorkingHoursTariffGroupRef": 73})])
+
+    def test_full_save(self):
+        exit_code, results = self.run_main("--netid", "f007dch", "--full-save")
+
+        self.assertEqual(exit_code, sharding.EXIT_OK)
+        self.assertEqual(self.patches(), [])
+        self.assertEqual([(person.NetID, person.TradeRef, person.WorkingHoursTariffGroupRef) for person in self.planon_replay.saved], [("f007dch", 115, 73)])
+
+    def test_unknown_crew_code_is_unstable(self):
+        employees = fixtures.load_recording("ipaas", "employees.json")
+        employees[1]["jobs"][0]["maintenance_crew"]["crew_code"] = "XYZ"
+
+        exit_code, results = self.run_main("--netid", "f007dch", employees=employees)
+
+        self.assertEqual(exit_code, sharding.EXIT_UNSTABLE)
+        self.assertEqual(results["failed"][0]["exception_type"], "KeyError")
+
+    def test_mirror(self):
+        mirror_path = os.path.join(self.directory.name, "planon.sqlite")
+        self.run_main("--netid", "f007dch", "--mirror", mirror_path)
+        exit_code, results = self.run_main("--netid", "f007dch", "--mirror", mirror_path)
+
+        self.assertEqual(exit_code, sharding.EXIT_OK)
+        self.assertEqual(results["skipped"], ["f007dch"])  # the mirror has the update applied by the first run
+        self.assertEqual(self.patches(), [])
+        self.assertEqual([filter for resource, filter in self.planon_replay.finds if resource == "Person"], [{"filter": {"SysChangeDateTime": {"gte": "2026-10-05 10:20:00"}}}])
+
+    def test_default_netids(self):
+        with mock.patch.object(main, "DEFAULT_NETIDS", ["f007dch"]):
+            exit_code, results = self.run_main()
+
+        self.assertEqual(exit_code, sharding.EXIT_OK)
+        self.assertEqual((results["updated"], results["skipped"], results["stale"]), (["f007dch"], [], []))
+
+    def test_full_population(self):
+        exit_code, results = self.run_main()
+
+        self.assertEqual(exit_code, sharding.EXIT_OK)
+        self.assertEqual(results["updated"], ["f007dch", "d13523b"])  # the new crew first, then the lost one
+        self.assertEqual(sorted(results["skipped"]), ["d20171b", "f00207h"])
+        self.assertEqual(results["failed"], [])  # d28941t (ML, an excluded crew) and f000000 have no crew to give and no Planon person
+
+    def test_lost_crew_is_cleared(self):
+        exit_code, results = self.run_main("--netid", "d13523b")
+
+        self.assertEqual(exit_code, sharding.EXIT_OK)
+        self.assertEqual((results["updated"], results["stale"]), (["d13523b"], []))  # no jobs in iPaaS, still BAS in Planon
+        self.assertEqual(self.patches(), [(f"{fixtures.PLANON_API_URL}/Person/90412", {"TradeRef": None, "WorkingHoursTariffGroupRef": None})])
+
+    def test_netids_pushed_down(self):
+        self.run_main("--netid", "f007dch", "--netid", "f00207h", "--pushdown", "netids")
+
+        self.assertIn("netid=f00207h%2Cf007dch", self.http_replay.requests[1].url)
+
+    def test_keyset_pages(self):
+        exit_code, results = self.run_main("--netid", "f007dch", "--adaptive-pages", "--page-cursor", "netid_gt")
+
+        self.assertEqual(results["updated"], ["f007dch"])
+        self.assertEqual(self.http_replay.requests[1].url, f"{fixtures.DARTMOUTH_API_URL}/api/employees?pagesize=1000")
+
+    def test_reports_stale_crews(self):
+        exit_code, results = self.run_main(employees=self.employees_in_planon("d13523b"))
+
+        self.assertEqual(results["stale"], ["d13523b"])  # left iPaaS, still BAS in Planon
+        self.assertEqual(results["cleared"], [])
+
+    def test_clear_stale_crews(self):
+        exit_code, results = self.run_main("--clear-stale", "--max-stale-fraction", "0.5", employees=self.employees_in_planon("d13523b"))
+
+        self.assertEqual(exit_code, sharding.EXIT_OK)
+        self.assertEqual(results["cleared"], ["d13523b"])
+        self.assertEqual(self.patches()[1:], [(f"{fixtures.PLANON_API_URL}/Person/90412", {"TradeRef": None, "WorkingHoursTariffGroupRef": None})])
+
+    def test_stale_batch_size_bounds_one_run(self):
+        exit_code, results = self.run_main("--clear-stale", "--max-stale-fraction", "0.5", "--stale-batch-size", "1", employees=self.employees_in_planon("d13523b", "d20171b"))
+
+        self.assertEqual(exit_code, sharding.EXIT_OK)
+        self.assertEqual(results["stale"], ["d13523b", "d20171b"])
+        self.assertEqual(results["cleared"], ["d13523b"])
+
+    def test_refuses_to_clear_too_many_stale_crews(self):
+        exit_code, results = self.run_main("--clear-stale", employees=self.employees_in_planon("d13523b"))
+
+        self.assertEqual(exit_code, sharding.EXIT_UNSTABLE)  # 1 of 4 persons with a crew is stale, over the default 0.1
+        self.assertEqual((results["stale"], results["cleared"]), (["d13523b"], []))
+        self.assertEqual(len(self.patches()), 1)  # only f007dch's new crew
+
+    def test_refuses_to_clear_after_an_empty_fetch(self):
+        exit_code, results = self.run_main("--clear-stale", "--max-stale-fraction", "1", employees=[])
+
+        self.assertEqual(exit_code, sharding.EXIT_UNSTABLE)
+        self.assertEqual(results["cleared"], [])
+        self.assertEqual(self.patches(), [])
+
+    def test_trace_file(self):
+        trace_file = os.path.join(self.directory.name, "trace.json")
+        self.run_main("--netid", "f007dch", "--trace-file", trace_file)
+
+        with open(trace_file) as f:
+            events = json.load(f)["traceEvents"]
+
+        phases = [event["name"] for event in events if event["cat"] == "phase"]
+        self.assertEqual(phases, ["dart_employees", "planon_data", "compare", "updates"])
+        self.assertEqual([event["name"] for event in events if event["cat"] == "planon"], ["Trade.find", "WorkingHoursTariffGroup.find", "Person.find"])
+        patch = next(event for event in events if event["args"].get("method") == "PATCH")
+        self.assertEqual((patch["args"]["syscode"], patch["args"]["netid"], patch["args"]["status"], patch["args"]["phase"]), ("90210", "f007dch", 200, "updates"))
+
+    def test_trace_file_after_a_crash(self):
+        def unexpected_page(request):
+            raise ValueError("unexpected page")
+
+        trace_file = os.path.join(self.directory.name, "trace.json")
+        routes = {**fixtures.ipaas_routes(), "GET /api/employees": unexpected_page}
+        with mock.patch.dict(os.environ, fixtures.ENVIRON), fixtures.planon_offline(), fixtures.offline(routes):
+            with self.assertRaises(ValueError):
+                main.main(["--checkpoint-dir", self.directory.name, "--trace-file", trace_file])
+
+        with open(trace_file) as f:
+            events = json.load(f)["traceEvents"]
+
+        self.assertEqual([event["args"].get("error") for event in events if event["cat"] == "http"], [None, "ValueError"])
+
+    def test_deadline_before_any_update(self):
+        exit_code, results = self.run_main("--deadline", "0")
+
+        self.assertEqual(exit_code, sharding.EXIT_PARTIAL)
+        self.assertEqual((results["updated"], results["deferred"]), ([], []))
+        self.assertEqual(self.http_replay.requests, [])
+
+    def test_deadline_during_fetch(self):
+        def page_past_the_deadline(request):
+            clock.advance(0.2)
+            raise requests.ReadTimeout("read timed out")
+
+        sigterm_handler = signal.getsignal(signal.SIGTERM)
+        trace_file = os.path.join(self.directory.name, "trace.json")
+        routes = {**fixtures.ipaas_routes(), "GET /api/employees": page_past_the_deadline}
+        with mock.patch.dict(os.environ, fixtures.ENVIRON), fixtures.planon_offline(), fixtures.offline(routes), fixtures.deadline_clock() as clock:
+            with self.assertRaises(SystemExit) as cm:
+                main.main(["--checkpoint-dir", self.directory.name, "--results-file", self.results_file, "--deadline", "0.1", "--trace-file", trace_file])
+        results = sharding.read_results(self.results_file)
+
+        self.assertEqual(cm.exception.code, sharding.EXIT_PARTIAL)
+        self.assertEqual((results["updated"], results["failed"]), ([], []))
+        self.assertTrue(os.path.exists(trace_file))
+        self.assertEqual(signal.getsignal(signal.SIGTERM), sigterm_handler)  # restored
+
+    def test_sigterm_defers_the_remaining_writes(self):
+        def patch_then_sigterm(request):
+            os.kill(os.getpid(), signal.SIGTERM)
+            return fixtures.recorded(body={})
+
+        sigterm_handler = signal.getsignal(signal.SIGTERM)
+        routes = {**fixtures.ipaas_routes(self.employees_in_planon("d13523b")), r"PATCH /api/Person/\d+": patch_then_sigterm}
+        with mock.patch.dict(os.environ, fixtures.ENVIRON), fixtures.planon_offline(), fixtures.offline(routes) as self.http_replay:
+            with self.assertRaises(SystemExit) as cm:
+                main.main(["--checkpoint-dir", self.directory.name, "--results-file", self.results_file, "--clear-stale", "--max-stale-fraction", "0.5"])
+        results = sharding.read_results(self.results_file)
+
+        self.assertEqual(cm.exception.code, sharding.EXIT_PARTIAL)
+        self.assertEqual(results["updated"], ["f007dch"])  # the new crew goes first, the write in flight finishes
+        self.assertEqual(results["deferred"], ["d13523b"])
+        self.assertEqual(len(self.patches()), 1)
+        self.assertEqual(signal.getsignal(signal.SIGTERM), sigterm_handler)  # restored
+
+    def test_resume_skips_applied_netids(self):
+        self.run_main("--netid", "f007dch")
+        exit_code, results = self.run_main("--netid", "f007dch", "--resume")
+
+        self.assertEqual(exit_code, sharding.EXIT_OK)
+        self.assertEqual(results["updated"], ["f007dch"])
+        self.assertEqual(self.patches(), [])
+
+    def test_resume_refetches_for_other_netids(self):
+        self.run_main("--netid", "f007dch")
+
+        # the persisted fetch only has f007dch
+        exit_code, results = self.run_main("--resume", "--netid", "d13523b")
+        self.assertEqual(results["updated"], ["d13523b"])
+        self.assertEqual(self.patches(), [(f"{fixtures.PLANON_API_URL}/Person/90412", {"TradeRef": None, "WorkingHoursTariffGroupRef": None})])
+
+        # nor is a partial fetch reused for the whole population, the other crews would look stale
+        exit_code, results = self.run_main("--resume", "--clear-stale", "--max-stale-fraction", "1")
+        self.assertEqual(sorted(results["skipped"]), ["d20171b", "f00207h"])
+        self.assertEqual((results["stale"], self.patches()), ([], []))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+import unittest
+
+import requests
+
+from ipaas import paging
+from ipaas import utils
+from tests import fixtures
+from tests.get_resources_unittest import synthetic_employees
+
+
+class TestPager(unittest.TestCase):
+
+    def test_short_first_page_is_the_last(self):
+        pager = paging.Pager(1000, adaptive=True)
+        pager.next_page(synthetic_employees(6), seconds=0.1, size=1_000)
+
+        self.assertTrue(pager.done)
+
+    def test_page_size_grows_on_fast_pages(self):
+        offset = paging.Pager(1000, adaptive=True)
+        offset.next_page(synthetic_employees(1000), seconds=0.05, size=100_000)
+        self.assertEqual(offset.params(), {"pagesize": 1000, "page": 2})  # a page of 2000 can't start at record 1000
+        offset.next_page(synthetic_employees(1000), seconds=0.05, size=100_000)
+        self.assertEqual(offset.params(), {"pagesize": 2000, "page": 2})
+
+        keyset = paging.Pager(1000, adaptive=True, cursor_param="netid_gt")
+        keyset.next_page(synthetic_employees(1000), seconds=0.05, size=100_000)
+        self.assertEqual(keyset.page_size, 2000)
+
+    def test_offset_page_size_grows_back_when_aligned(self):
+        pager = paging.Pager(1000, adaptive=True)
+        pager.next_page(synthetic_employees(1000), seconds=5.0, size=100_000)
+        pager.next_page(synthetic_employees(500), seconds=0.1, size=50_000)
+        self.assertEqual(pager.params(), {"pagesize": 500, "page": 4})  # 1500 records fetched, a page of 1000 can't start there
+
+        pager.next_page(synthetic_employees(500), seconds=0.1, size=50_000)
+        self.assertEqual(pager.params(), {"pagesize": 1000, "page": 3})  # records 2000-2999
+
+    def test_page_size_shrinks_on_slow_or_large_pages(self):
+        slow = paging.Pager(1000, adaptive=True)
+        slow.next_page(synthetic_employees(1000), seconds=5.0, size=100_000)
+
+        large = paging.Pager(1000, adaptive=True, max_page_bytes=400_000)
+        large.next_page(synthetic_employees(1000), seconds=0.1, size=1_000_000)
+
+        self.assertEqual((slow.page_size, large.page_size), (500, 500))
+
+    def test_keyset_params(self):
+        pager = paging.Pager(1000, adaptive=True, cursor_param="netid_gt")
+        self.assertEqual(pager.params(), {"pagesize": 1000})
+
+        pager.next_page(synthetic_employees(1000), seconds=5.0, size=100_000)
+        self.assertEqual(pager.params(), {"pagesize": 500, "netid_gt": "f000999"})
+
+    def test_keyset_not_moving_forward(self):
+        pager = paging.Pager(2, cursor_param="netid_gt")
+        pager.next_page([{"netid": "a"}, {"netid": "b"}])
+
+        self.assertRaises(paging.PagingError, pager.next_page, [{"netid": "a"}, {"netid": "b"}])
+
+    def test_duplicates_dropped(self):
+        pager = paging.Pager(2)
+
+        self.assertEqual(pager.next_page([{"netid": "a"}, {"netid": "b"}]), [{"netid": "a"}, {"netid": "b"}])
+        with self.assertLogs(paging.log, "WARNING") as logs:
+            self.assertEqual(pager.next_page([{"netid": "b"}, {"netid": "c"}]), [{"netid": "c"}])  # a record was removed before page 2
+        self.assertEqual(pager.duplicates, 1)
+        self.assertEqual(len(logs.output), 1)
+
+    def test_capped_keyset_page_is_not_the_last(self):
+        pager = paging.Pager(1000, adaptive=True, cursor_param="netid_gt")
+        pager.next_page(synthetic_employees(1000), seconds=0.05, size=100_000)
+        pager.next_page(synthetic_employees(2000)[1000:], seconds=0.05, size=100_000)  # asked for 2000
+
+        self.assertFalse(pager.done)
+        self.assertEqual((pager.cap, pager.page_size), (1000, 1000))
+
+        pager.next_page(synthetic_employees(3000)[2000:], seconds=0.05, size=100_000)
+        self.assertEqual(pager.page_size, 1000)  # never grown past the cap again
+
+    def test_capped_offset_page_is_read_again(self):
+        pager = paging.Pager(1000, adaptive=True)
+        pager.next_page(synthetic_employees(1000), seconds=0.05, size=100_000)
+        pager.next_page(synthetic_employees(1000), seconds=0.05, size=100_000)
+
+        # page 2 of 1000 records instead of page 2 of 2000, records the pager already has
+        self.assertEqual(pager.next_page(synthetic_employees(2000)[1000:]), [])
+        self.assertFalse(pager.done)
+        self.assertEqual(pager.params(), {"pagesize": 1000, "page": 3})
+
+    def test_fewer_records_than_announced(self):
+        pager = paging.Pager(2)
+        pager.next_page([{"netid": "a"}, {"netid": "b"}], headers={"X-Total-Count": "3"})
+
+        self.assertRaises(paging.PagingError, pager.next_page, [], headers={"X-Total-Count": "3"})
+
+    def test_total_count_ends_on_last_full_page(self):
+        pager = paging.Pager(2)
+        pager.next_page([{"netid": "a"}, {"netid": "b"}], headers={"X-Total-Count": "2"})
+
+        self.assertTrue(pager.done)
+
+
+class TestGetResourcesPaging(unittest.TestCase):
+
+    def get_resources(self, employees, pager, total_count=False, **paged):
+        routes = {**fixtures.ipaas_routes(employees, total_count), "GET /api/employees": fixtures.paged(employees, total_count, **paged)}
+        with fixtures.offline(routes) as replay:
+            resources = utils.get_resources(jwt="recorded-jwt", url=f"{fixtures.DARTMOUTH_API_URL}/api/employees", session=requests.Session(), pager=pager)
+        return resources, replay
+
+    def test_exact_multiple_with_total_count(self):
+        resources, replay = self.get_resources(synthetic_employees(2000), None, total_count=True)
+
+        self.assertEqual(len(resources), 2000)
+        self.assertEqual(len(replay.requests), 2)  # no empty page
+
+    def test_adaptive_offset_scan_is_complete(self):
+        employees = synthetic_employees(9500)
+        resources, replay = self.get_resources(employees, paging.Pager(1000, adaptive=True))
+
+        self.assertEqual(resources, employees)
+        self.assertEqual([request.url.split("?")[1] for request in replay.requests], ["pagesize=1000&page=1", "pagesize=1000&page=2", "pagesize=2000&page=2", "pagesize=4000&page=2", "pagesize=8000&page=2"])
+
+    def test_single_short_page(self):
+        resources, replay = self.get_resources(synthetic_employees(6), paging.Pager(1000, adaptive=True))
+
+        self.assertEqual(len(resources), 6)
+        self.assertEqual(len(replay.requests), 1)
+
+    def test_server_capped_page_size(self):
+        employees = synthetic_employees(9500)
+        resources, replay = self.get_resources(employees, paging.Pager(1000, adaptive=True), max_page_size=1000)
+
+        self.assertEqual(resources, employees)
+        self.assertEqual(len(replay.requests), 11)  # the grown page 2 is read again at the cap
+
+    def test_server_capped_keyset_scan(self):
+        employees = synthetic_employees(9500)
+        with self.assertNoLogs(paging.log, "WARNING"):
+            resources, replay = self.get_resources(employees, paging.Pager(1000, adaptive=True, cursor_param="netid_gt"), max_page_size=1000)
+
+        self.assertEqual(resources, employees)
+        self.assertEqual(len(replay.requests), 10)
+
+    def test_cursor_ignored_by_the_endpoint(self):
+        self.assertRaises(paging.PagingError, self.get_resources, synthetic_employees(2500), paging.Pager(1000, cursor_param="netid_gt"), keyset=False)
+
+    def test_keyset_scan(self):
+        employees = list(reversed(synthetic_employees(2500)))
+        resources, replay = self.get_resources(employees, paging.Pager(1000, cursor_param="netid_gt"))
+
+        self.assertEqual([resource["netid"] for resource in resources], sorted(employee["netid"] for employee in employees))
+        self.assertTrue(replay.requests[1].url.endswith("netid_gt=f000999"))
+
+
+if __name__ == '__main__':
+    unittest.main()
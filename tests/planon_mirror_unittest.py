@@ -0,0 +1,65 @@
+import unittest
+
+from ipaas import planon_mirror
+from tests import fixtures
+
+
+class TestPlanonMirror(unittest.TestCase):
+
+    def setUp(self):
+        self.replay = fixtures.PlanonReplay(fixtures.planon_recordings())
+        self.find = self.replay.find("Person")
+        self.mirror = planon_mirror.PlanonMirror(":memory:")
+
+    def tearDown(self):
+        self.mirror.close()
+
+    def test_full_resync(self):
+        self.assertEqual(self.mirror.refresh(self.find), 6)
+
+        persons = self.mirror.persons()
+        self.assertEqual(sorted(persons), ["d13523b", "d20171b", "f00207h", "f007dch"])  # no archived, no missing NetID
+        self.assertEqual(persons["f007dch"], planon_mirror.MirroredPerson(90210, "f007dch", 263, 93, False, "2026-09-14 13:30:00"))
+        self.assertEqual(self.mirror.high_water_mark, "2026-10-05 10:20:00")
+        self.assertTrue(self.mirror.get("f003841").IsArchived)
+
+    def test_incremental_refresh(self):
+        self.mirror.refresh(self.find)
+
+        person = self.replay.records["Person"][1]
+        person.TradeRef, person.SysChangeDateTime = 115, "2026-10-19 07:00:00"
+
+        self.assertEqual(self.mirror.refresh(self.find), 2)  # and the person at the high-water mark, again
+        self.assertEqual(self.replay.finds[-1], ("Person", {"filter": {planon_mirror.MODIFIED_FIELD: {"gte": "2026-10-05 10:20:00"}}}))
+        self.assertEqual(self.mirror.get("f007dch").TradeRef, 115)
+        self.assertEqual(self.mirror.high_water_mark, "2026-10-19 07:00:00")
+
+    def test_change_at_the_high_water_mark(self):
+        self.mirror.refresh(self.find)
+
+        # changed after the last refresh, within the same second as the high-water mark
+        person = self.replay.records["Person"][1]
+        person.TradeRef, person.SysChangeDateTime = 115, "2026-10-05 10:20:00"
+
+        self.mirror.refresh(self.find)
+        self.assertEqual(self.mirror.get("f007dch").TradeRef, 115)
+
+    def test_periodic_full_resync(self):
+        self.mirror.refresh(self.find)
+        self.replay.records["Person"].pop(0)  # deleted in Planon, only a full resync notices
+        self.mirror.full_resync_interval = -1
+
+        self.mirror.refresh(self.find)
+
+        self.assertEqual(self.replay.finds[-1], ("Person", None))
+        self.assertIsNone(self.mirror.get("d20171b"))
+
+    def test_set_crew(self):
+        self.mirror.refresh(self.find)
+        self.mirror.set_crew(90210, 115, None)
+
+        self.assertEqual(self.mirror.get("f007dch")[2:4], (115, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import json
+import unittest
+
+import requests
+
+from ipaas import decoding
+from ipaas import utils
+from ipaas.query import EmployeeQuery
+from tests import fixtures
+
+
+class TestEmployeeQuery(unittest.TestCase):
+
+    def setUp(self):
+        self.employees = fixtures.load_recording("ipaas", "employees.json")
+
+    def test_client_side(self):
+        employee_query = EmployeeQuery().has_maintenance_crew()
+
+        self.assertEqual(employee_query.params(), {})
+        self.assertEqual([employee["netid"] for employee in employee_query.apply(self.employees)], ["d20171b", "f007dch", "f00207h", "d28941t"])
+
+    def test_active_jobs_and_fields(self):
+        employee_query = EmployeeQuery().active_jobs().fields("netid")
+
+        self.assertEqual(employee_query.apply(self.employees), [{"netid": netid} for netid in ["d20171b", "f007dch", "f00207h", "d28941t", "f000000"]])
+
+    def test_changed_since(self):
+        employees = decoding.decode_employees(json.dumps([
+            {"netid": "d20171b", "last_updated": "2026-09-01", "first_name": "Ann"},
+            {"netid": "f007dch", "last_updated": "2026-10-18"},
+            {"netid": "f00207h"},
+            {"netid": "d13523b", "last_updated": 1760000000},
+        ]).encode())
+
+        self.assertEqual([employee["netid"] for employee in EmployeeQuery().changed_since("2026-10-01").apply(employees)], ["f007dch", "f00207h", "d13523b"])
+
+    def test_pushed_down(self):
+        employee_query = EmployeeQuery(supported=["netids", "has_maintenance_crew"]).has_maintenance_crew().netids(["f007dch", "d20171b"]).active_jobs()
+
+        self.assertEqual(employee_query.params(), {"has_maintenance_crew": "true", "netid": "d20171b,f007dch"})
+        self.assertEqual(employee_query.client_filters(), ["active_jobs"])
+        # netids and has_maintenance_crew were applied by the endpoint, only d13523b (no jobs) fails active_jobs
+        self.assertEqual(len(employee_query.apply(self.employees)), 5)
+
+    def test_unknown_filter(self):
+        self.assertRaises(ValueError, EmployeeQuery, supported=["department"])
+
+
+class TestGetResourcesQuery(unittest.TestCase):
+
+    def test_filtered_while_paging(self):
+        employees = [{"netid": f"f{n:06d}", "jobs": [{"maintenance_crew": {"crew_code": "ACS"}, "job_current_status": "Active"}] if n % 10 == 0 else []} for n in range(2500)]
+
+        with fixtures.offline(fixtures.ipaas_routes(employees)) as replay:
+            resources = utils.get_resources(jwt="recorded-jwt", url=f"{fixtures.DARTMOUTH_API_URL}/api/employees", session=requests.Session(), query=EmployeeQuery().has_maintenance_crew())
+
+        self.assertEqual(len(resources), 250)
+        self.assertEqual(len(replay.requests), 3)  # a short page is judged on what the endpoint returned, not on what was kept
+
+    def test_params_in_url(self):
+        with fixtures.offline(fixtures.ipaas_routes()) as replay:
+            utils.get_resources(jwt="recorded-jwt", url=f"{fixtures.DARTMOUTH_API_URL}/api/employees", session=requests.Session(), query=EmployeeQuery(supported=["has_maintenance_crew"]).has_maintenance_crew())
+
+        self.assertTrue(replay.requests[0].url.endswith("?pagesize=1000&page=1&has_maintenance_crew=true"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import os
+import tempfile
+import unittest
+
+from ipaas import sharding
+
+
+class TestSharding(unittest.TestCase):
+
+    def test_parse_shard(self):
+        self.assertEqual(sharding.parse_shard("0/4"), (0, 4))
+        self.assertEqual(sharding.parse_shard("3/4"), (3, 4))
+
+    def test_parse_invalid_shard(self):
+        for spec in ("4/4", "-1/4", "0/0", "1", "a/b"):
+            self.assertRaises(ValueError, sharding.parse_shard, spec)
+
+    def test_every_netid_in_exactly_one_shard(self):
+        netids = [f"f{n:06d}" for n in range(1000)]
+        for netid in netids:
+            shards = [index for index in range(4) if sharding.in_shard(netid, (index, 4))]
+            self.assertEqual(len(shards), 1)
+
+    def test_shard_is_case_insensitive(self):
+        self.assertEqual(sharding.shard_of("F007DCH", 8), sharding.shard_of("f007dch", 8))
+
+    def test_no_shard(self):
+        self.assertTrue(sharding.in_shard("f007dch", None))
+
+
+class TestMergeResults(unittest.TestCase):
+
+    def write_shard(self, directory, index, failed, exit_code):
+        path = os.path.join(directory, f"shard-{index}-of-2.json")
+        sharding.write_results(path, (index, 2), [f"u{index}"], [f"s{index}"], failed, exit_code)
+        return sharding.read_results(path)
+
+    def test_merge(self):
+        with tempfile.TemporaryDirectory() as directory:
+            shard_0 = self.write_shard(directory, 0, [], sharding.EXIT_OK)
+            shard_1 = self.write_shard(directory, 1, [{"netid": "f1", "exception": KeyError(263)}], sharding.EXIT_UNSTABLE)
+
+        merged = sharding.merge_results([shard_0, shard_1])
+
+        self.assertEqual(merged["updated"], ["u0", "u1"])
+        self.assertEqual(merged["skipped"], ["s0", "s1"])
+        self.assertEqual(merged["failed"][0]["exception_type"], "KeyError")
+        self.assertEqual(merged["exit_code"], sharding.EXIT_UNSTABLE)
+
+    def test_partial_shard(self):
+        with tempfile.TemporaryDirectory() as directory:
+            shard_0 = self.write_shard(directory, 0, [], sharding.EXIT_UNSTABLE)
+            shard_1 = self.write_shard(directory, 1, [], sharding.EXIT_PARTIAL)
+
+        merged = sharding.merge_results([shard_0, shard_1])
+
+        self.assertEqual(merged["exit_code"], sharding.EXIT_PARTIAL)
+
+    def test_crashed_shard(self):
+        with tempfile.TemporaryDirectory() as directory:
+            shard_0 = self.write_shard(directory, 0, [], sharding.EXIT_UNSTABLE)
+
+        merged = sharding.merge_results([shard_0, None])
+
+        self.assertEqual(merged["exit_code"], sharding.EXIT_WORKER_FAILED)
+
+    def test_missing_shard(self):
+        with tempfile.TemporaryDirectory() as directory:
+            shard_0 = self.write_shard(directory, 0, [], sharding.EXIT_OK)
+
+        merged = sharding.merge_results([shard_0])
+
+        self.assertEqual(merged["exit_code"], sharding.EXIT_WORKER_FAILED)
+        self.assertEqual(sharding.missing_shards(merged["shards"]), ["shard 1/2 is missing"])
+
+    def test_duplicate_shard(self):
+        with tempfile.TemporaryDirectory() as directory:
+            shard_0 = self.write_shard(directory, 0, [], sharding.EXIT_OK)
+            shard_1 = self.write_shard(directory, 1, [], sharding.EXIT_OK)
+
+        merged = sharding.merge_results([shard_0, shard_1, shard_1])
+
+        self.assertEqual(merged["exit_code"], sharding.EXIT_WORKER_FAILED)
+        self.assertEqual(sharding.missing_shards(merged["shards"]), ["shard 1/2 is there 2 times"])
+
+    def test_mixed_shard_counts(self):
+        self.assertEqual(sharding.missing_shards(["0/2", "1/2", "2/3"]), ["shards of different counts [2, 3]"])
+        self.assertEqual(sharding.missing_shards([None]), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
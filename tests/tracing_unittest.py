@@ -0,0 +1,114 @@
+import json
+import os
+import tempfile
+import unittest
+
+import requests
+
+from ipaas import hedging
+from ipaas import paging
+from ipaas import tracing
+from ipaas import utils
+from tests import fixtures
+from tests.get_resources_unittest import synthetic_employees
+
+
+class TestUrlTemplate(unittest.TestCase):
+
+    def test_page(self):
+        self.assertEqual(
+            tracing.url_template("https://api.dartmouth.test/api/employees?pagesize=1000&page=3"),
+            ("https://api.dartmouth.test/api/employees?pagesize={pagesize}&page={page}", {"pagesize": "1000", "page": "3"}),
+        )
+
+    def test_cursor(self):
+        url = "https://api.dartmouth.test/api/employees?pagesize=1000&netid_gt=f000999"
+
+        self.assertEqual(tracing.url_template(url)[1], {"pagesize": "1000"})
+        self.assertEqual(tracing.url_template(url, tracing.QUERY_ARGS + ("netid_gt",))[1], {"pagesize": "1000", "netid_gt": "f000999"})
+
+    def test_path_values(self):
+        self.assertEqual(tracing.url_template("https://api.dartmouth.test/api/employees/f007dch"), ("https://api.dartmouth.test/api/employees/{netid}", {"netid": "f007dch"}))
+        self.assertEqual(tracing.url_template("https://planon.test/api/Person/90210"), ("https://planon.test/api/Person/{syscode}", {"syscode": "90210"}))
+
+
+class TestTracer(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.trace_file = os.path.join(self.directory.name, "trace.json")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_http_spans_nest_under_phase(self):
+        tracer = tracing.Tracer(self.trace_file)
+        with fixtures.offline(fixtures.ipaas_routes(synthetic_employees(1500))):
+            with tracer.span("dart_employees", cat="phase"):
+                utils.get_resources(jwt="recorded-jwt", url=f"{fixtures.DARTMOUTH_API_URL}/api/employees", session=tracer.instrument(requests.Session()))
+        tracer.write()
+
+        with open(self.trace_file) as f:
+            events = json.load(f)["traceEvents"]
+
+        phase, pages = events[-1], events[:-1]
+        self.assertEqual(phase["name"], "dart_employees")
+        self.assertEqual([page["args"]["page"] for page in pages], ["1", "2"])
+        self.assertEqual(pages[0]["name"], f"GET {fixtures.DARTMOUTH_API_URL}/api/employees?pagesize={{pagesize}}&page={{page}}")
+        self.assertEqual({key: pages[0]["args"][key] for key in ("method", "status", "retries", "phase")}, {"method": "GET", "status": 200, "retries": 0, "phase": "dart_employees"})
+        self.assertGreater(pages[0]["args"]["bytes"], pages[1]["args"]["bytes"])
+        for page in pages:
+            self.assertEqual(page["ph"], "X")
+            self.assertTrue(phase["ts"] <= page["ts"] and page["ts"] + page["dur"] <= phase["ts"] + phase["dur"])
+
+    def test_keyset_pages_carry_the_cursor(self):
+        tracer = tracing.Tracer(self.trace_file, cursor_param="netid_gt")
+        with fixtures.offline(fixtures.ipaas_routes(synthetic_employees(1500))):
+            utils.get_resources(jwt="recorded-jwt", url=f"{fixtures.DARTMOUTH_API_URL}/api/employees", session=tracer.instrument(requests.Session()), pager=paging.Pager(1000, cursor_param="netid_gt"))
+
+        self.assertEqual([event["args"].get("netid_gt") for event in tracer.events], [None, "f000999"])
+
+    def test_tagged(self):
+        tracer = tracing.Tracer(self.trace_file)
+        with fixtures.offline(fixtures.ipaas_routes()):
+            with tracer.tagged(netid="f007dch"):
+                utils.update_person_crew(url=fixtures.PLANON_API_URL, jwt="planon-key", syscode=90210, trade_ref=115, laborgroup_ref=73, session=tracer.instrument(requests.Session()))
+            with tracer.span("Person.find", cat="planon"):
+                pass
+
+        self.assertEqual([event["args"].get("netid") for event in tracer.events], ["f007dch", None])
+
+    def test_hedged_attempts_trace_like_the_caller(self):
+        tracer = tracing.Tracer(self.trace_file)
+        hedge = hedging.HedgePolicy()
+        self.addCleanup(hedge.shutdown)
+        with fixtures.offline(fixtures.ipaas_routes(synthetic_employees(10))):
+            with tracer.span("dart_employees", cat="phase"), tracer.tagged(shard="0/4"):
+                utils.get_resources(jwt="recorded-jwt", url=f"{fixtures.DARTMOUTH_API_URL}/api/employees", session=tracer.instrument(requests.Session()), hedge=hedge)
+
+        page, phase = tracer.events
+        self.assertEqual(page["tid"], phase["tid"])  # on the thread of the phase, not of the attempt
+        self.assertEqual((page["args"]["shard"], page["args"]["phase"]), ("0/4", "dart_employees"))
+
+    def test_failed_request(self):
+        def connection_refused(request):
+            raise requests.ConnectionError("Connection refused")
+
+        tracer = tracing.Tracer(self.trace_file)
+        with fixtures.offline({"GET /api/employees": connection_refused}):
+            self.assertRaises(requests.ConnectionError, utils.get_resources, jwt="recorded-jwt", url=f"{fixtures.DARTMOUTH_API_URL}/api/employees", session=tracer.instrument(requests.Session()))
+
+        self.assertEqual(tracer.events[0]["args"]["error"], "ConnectionError")
+
+    def test_slow_call_is_logged(self):
+        tracer = tracing.Tracer(slow_threshold=0)
+        with fixtures.offline(fixtures.ipaas_routes()):
+            with self.assertLogs(tracing.log, "WARNING") as logs:
+                utils.update_person_crew(url=fixtures.PLANON_API_URL, jwt="planon-key", syscode=90210, trade_ref=115, laborgroup_ref=73, session=tracer.instrument(requests.Session()))
+
+        self.assertIn(f"Slow call PATCH {fixtures.PLANON_API_URL}/Person/{{syscode}}", logs.output[0])
+        self.assertEqual(tracer.events, [])  # no trace file, nothing kept
+
+
+if __name__ == '__main__':
+    unittest.main()